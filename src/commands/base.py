@@ -1,17 +1,16 @@
 from src.discord import slash_command, Interaction, message_command, InteractionContextType, Message, ApplicationCommandOption, ApplicationCommandOptionType, Embed, Permission, ApplicationIntegrationType, ApplicationCommandOptionChoice, Attachment, File, ActionRow
 from src.components import modal_plural_edit, umodal_edit, button_api_key, help_components, button_delete_all_data
-from src.porting import StandardExport, PluralExport, PluralKitExport, TupperboxExport, LogMessage
+from src.porting import StandardExport, PluralExport, LogMessage, ExportTooLarge, read_export, export_account, MAX_ATTACHMENT_SIZE
 from src.db import Message as DBMessage, ProxyMember, Latch, UserProxyInteraction
-from src.errors import InteractionError, Forbidden, PluralException
+from src.errors import InteractionError, Forbidden, PluralException, BasePluralException
 from src.logic.proxy import get_proxy_webhook, process_proxy
 from src.version import VERSION, LAST_TEN_COMMITS
-from src.discord.http import get_from_cdn
-from pydantic_core import ValidationError
+from src.core.supervisor import supervisor, TaskClass
+from src.discord.http import stream_from_cdn
 from src.models import DebugMessage
 from src.models import project
 from asyncio import gather
-from orjson import loads
-from io import BytesIO
+from io import SEEK_END
 from time import time
 
 
@@ -433,20 +432,29 @@ async def slash_export(
     interaction: Interaction,
     format: str = 'standard'
 ) -> None:
-    export = await PluralExport.from_account_id(interaction.author_id)
+    await interaction.response.defer()
 
-    if format == 'standard':
-        export = export.to_standard()
+    file = await export_account(interaction.author_id, format)
+    # ? File swaps out close while uploading, this always releases the temporary file
+    close = file.close
 
-    data = export.model_dump_json()
+    try:
+        if file.seek(0, SEEK_END) > MAX_ATTACHMENT_SIZE:
+            raise InteractionError(
+                'your export is too large to upload; please ask for help in the support server')
+
+        file.seek(0)
+
+        message = await interaction.followup.send(
+            content='your data is ready',
+            attachments=[File(
+                file,  # type: ignore
+                f'plural_export_{format}.json.gz'
+            )]
+        )
+    finally:
+        close()
 
-    message = await interaction.response.send_message(
-        content='your data is ready',
-        attachments=[File(
-            BytesIO(data.encode()),
-            f'plural_export_{format}.json'
-        )]
-    )
     await interaction.followup.send(
         message.attachments[0].url
     )
@@ -516,46 +524,103 @@ async def slash_import(
     url = file.url if file else file_url
     assert url is not None
 
+    # ? streamed so large exports (mostly pluralkit switch history) never sit in memory whole
     try:
-        data = loads(await get_from_cdn(url))
-    except Exception:
-        raise InteractionError('failed to read file')
-
-    for model in (PluralKitExport, PluralExport, TupperboxExport, StandardExport):
-        try:
-            export = model.model_validate(data)
-            break
-        except ValidationError as e:
-            continue
-    else:
+        export = await read_export(stream_from_cdn(url))
+    except ExportTooLarge:
+        raise InteractionError('export file is too large')
+    except ValueError:
         raise InteractionError(
             'invalid export format; if you believe this is a bug, please send a message in the support server')
+    except Exception:
+        raise InteractionError('failed to read file')
 
     if not isinstance(export, StandardExport):
         export = export.to_standard()
 
     await interaction.response.defer()
 
-    logs = [
+    plural = export.to_plural()
+    logs = _import_errors(await plural.import_to_account(interaction.author_id))
+    avatars = len(plural.pending_avatars)
+
+    message = await interaction.followup.send(
+        embeds=[_import_embed(logs, avatars, avatars)]
+    )
+
+    if avatars:
+        # ? avatars are slow to migrate, they're handled after the response
+        supervisor.spawn(
+            TaskClass.JOB,
+            _import_avatars(interaction, message.id, plural, logs))
+
+
+def _import_errors(logs: list[LogMessage | str]) -> list[str]:
+    return [
         log.lstrip('E: ')
-        for log in await export.to_plural().import_to_account(interaction.author_id)
+        for log in logs
         if log.startswith('E: ')
     ]
 
-    await interaction.followup.send(
-        embeds=(
-            [Embed.error(
-                title='import failed',
-                message=f'```{'\n'.join(logs)}```')]
-            if LogMessage.NOTHING_IMPORTED.lstrip('E: ') in logs else
-            [Embed.warning(
-                title='import successful, but with errors',
-                message=f'```{'\n'.join(logs)}```')]
-            if logs else
-            [Embed.success('import successful; no errors')]
-        )
+
+def _import_embed(
+    logs: list[str],
+    avatars_remaining: int = 0,
+    avatars_total: int = 0
+) -> Embed:
+    if LogMessage.NOTHING_IMPORTED.lstrip('E: ') in logs:
+        return Embed.error(
+            title='import failed',
+            message=f'```{'\n'.join(logs)}```')
+
+    embed = (
+        Embed.warning(
+            title='import successful, but with errors',
+            message=f'```{'\n'.join(logs)}```')
+        if logs else
+        Embed.success('import successful; no errors')
     )
 
+    if avatars_remaining:
+        embed.set_footer(
+            text=f'importing avatars ({avatars_total - avatars_remaining}/{avatars_total})...')
+
+    return embed
+
+
+async def _import_avatars(
+    interaction: Interaction,
+    message_id: int,
+    plural: PluralExport,
+    logs: list[str]
+) -> None:
+    last_update = 0.0
+
+    async def progress(done: int, total: int) -> None:
+        nonlocal last_update
+
+        # ? edits are rate limited, only update every few seconds
+        if done == total or time() - last_update < 3:
+            return
+
+        last_update = time()
+
+        try:
+            await interaction.followup.edit_message(
+                message_id,
+                embeds=[_import_embed(logs, total - done, total)])
+        except BasePluralException:
+            pass
+
+    avatar_logs = _import_errors(await plural.import_avatars(progress))
+
+    try:
+        await interaction.followup.edit_message(
+            message_id,
+            embeds=[_import_embed(logs + avatar_logs)])
+    except BasePluralException:
+        pass  # ? interaction token expires after 15 minutes
+
 
 @slash_command(
     name='version',
@@ -318,10 +318,12 @@ async def slash_member_set_group(
 
     old_group.members.remove(member.id)
     group.members.add(member.id)
+    member.group = group.id
 
     await gather(
         old_group.save(),
         group.save(),
+        member.save_changes(),
         interaction.response.send_message(
             embeds=[Embed.success(
                 f'member `{member.name}` of group `{old_group.name}` was moved from group `{group.name}`'
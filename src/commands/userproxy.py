@@ -74,7 +74,7 @@ async def _sed_edit(
 
     embed.set_footer(text=f'message id: {original_message.id}')
 
-    gather(
+    await gather(
         webhook.edit_message(
             '@original',
             content=edited_content),
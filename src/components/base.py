@@ -1,5 +1,6 @@
 from src.discord import modal, TextInput, Interaction, TextInputStyle, Message, ButtonStyle, Embed
-from src.db import ApiKey, Group, Message as DBMessage, Reply, UserProxyInteraction, Latch
+from src.core.supervisor import supervisor, TaskClass
+from src.db import ApiKey, DeletionJob
 from src.logic.proxy import get_proxy_webhook
 from src.discord.components import button
 from src.errors import InteractionError
@@ -83,47 +84,17 @@ async def button_delete_all_data(
 
     await interaction.response.defer()
 
-    images = []
-    tasks = []
-    userproxy_ids = set()
-
-    groups = await Group.find({'accounts': interaction.author_id}).to_list()
-
-    members = [
-        member
-        for group in groups
-        for member in await group.get_members()
-    ]
-
-    for group in groups:
-        if group.avatar:
-            images.append(group.delete_avatar())
-
-        tasks.append(group.delete())
-
-    for member in members:
-        if member.avatar:
-            images.append(member.delete_avatar())
-
-        if member.userproxy:
-            userproxy_ids.add(member.userproxy.bot_id)
-
-        tasks.append(member.delete())
-
-    tasks.append(DBMessage.find({'author_id': interaction.author_id}).delete())
-
-    tasks.append(Reply.find({'bot_id': {'$in': list(userproxy_ids)}}).delete())
-
-    tasks.append(UserProxyInteraction.find(
-        {'application_id': {'$in': list(userproxy_ids)}}).delete())
-
-    tasks.append(Latch.find({'user': interaction.author_id}).delete())
+    job = await DeletionJob.start(
+        interaction.author_id,
+        interaction.application_id,
+        interaction.token
+    )
 
-    await gather(*images)
+    if job is None:
+        raise InteractionError('your data is already being deleted')
 
-    await gather(
-        *tasks,
-        interaction.followup.send(
-            embeds=[Embed.success('all data successfully deleted')]
-        )
-    )
+    # ? progress is reported by editing the deferred response
+    if supervisor.spawn(TaskClass.JOB, job.run()) is None:
+        await job.mark_failed()
+        raise InteractionError(
+            'too many deletions are running right now, please try again later')
@@ -29,6 +29,8 @@ getLogger("uvicorn.access").addFilter(LocalHealthcheckFilter())
 async def lifespan(app: FastAPI):
     from src.models import project
     from src.db import MongoDatabase
+    from src.db.invalidation import invalidator
+    from src.db.blobs import blob_sweeper
     from .session import session
 
     DB = MongoDatabase(project.mongo_uri)
@@ -39,8 +41,24 @@ async def lifespan(app: FastAPI):
     import src.logic
     import src.commands
     from src.discord.commands import sync_commands
-
-    await sync_commands()
+    from src.discord.traffic import traffic
+    from .supervisor import supervisor
+    from src.logic.autocomplete import autocomplete_engine
+    from .dedup import event_dedup
+
+    from src.db import ProxyMember, Image, DeletionJob, UserProxySyncJob
+    from .supervisor import TaskClass
+    # ? off the startup path, usually a no-op thanks to the command fingerprint
+    supervisor.spawn(TaskClass.JOB, sync_commands())
+    # ? every stored-token userproxy, when the userproxy commands changed or a sync was interrupted
+    supervisor.spawn(TaskClass.JOB, UserProxySyncJob.sync_fleet())
+    # ? members created before group references existed
+    supervisor.spawn(TaskClass.JOB, ProxyMember.backfill_groups())
+    # ? images stored inline before the blob store existed
+    supervisor.spawn(TaskClass.JOB, Image.migrate_blobs())
+    blob_sweeper.start()
+    # ? deletions interrupted by a restart
+    await DeletionJob.resume_all()
 
     from src.routers import discord, message, member, latch, image, group
     app.include_router(discord.router)
@@ -53,7 +71,23 @@ async def lifespan(app: FastAPI):
 
     yield
 
+    await supervisor.drain()
+    await blob_sweeper.stop()
+    await invalidator.stop()
+    logfire.info(
+        'event dedup hit rate {hit_rate:.2%}',
+        hit_rate=event_dedup.stats.hit_rate,
+        **vars(event_dedup.stats)
+    )
+    logfire.info(
+        'autocomplete stats',
+        callbacks={
+            name: {**vars(stats), 'average_latency': stats.average_latency}
+            for name, stats in autocomplete_engine.stats.items()
+        }
+    )
     await session.close()
+    traffic.close()
     logfire.info('shutting down')
     logfire.shutdown()
 
@@ -75,7 +109,7 @@ def live_discord_redaction(request: Request | WebSocket, attributes: dict[str, A
 
     match request.url.path:
         # ? might do more later
-        case '/discord/event' | '/discord/interaction':
+        case '/discord/event' | '/discord/events' | '/discord/gateway' | '/discord/interaction':
             return None
 
     return attributes
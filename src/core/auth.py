@@ -1,12 +1,17 @@
 from src.discord.models import Interaction, ApplicationIntegrationType
+from src.discord.commands import userproxy_command_names, remember_userproxy_command
 from fastapi import Security, HTTPException, Request, Header
 from fastapi.security.api_key import APIKeyHeader
 from concurrent.futures import ThreadPoolExecutor
 from src.db import ApiKey, ProxyMember, ApiToken
+from src.db.invalidation import invalidator
 from nacl.exceptions import BadSignatureError
-from typing import NamedTuple, Annotated
+from typing import Any, NamedTuple, Annotated
 from nacl.signing import VerifyKey
 from asyncio import get_event_loop
+from functools import lru_cache
+from time import monotonic
+from orjson import loads
 from src.models import project
 from re import match, escape
 from bcrypt import checkpw
@@ -84,44 +89,137 @@ async def api_key_validator(api_key: str = Security(API_KEY)) -> TokenData:
     return token
 
 
+class UserproxyApp(NamedTuple):
+    verify_key: VerifyKey
+    accounts: frozenset[int]
+    loaded: float
+    expires: float
+
+
+USERPROXY_APP_TTL = 30
+# ? forced refreshes are limited, otherwise every bad signature would be a database read
+USERPROXY_APP_REFRESH_INTERVAL = 5
+_userproxy_apps: dict[int, UserproxyApp] = {}
+# ? member and group id -> the application ids cached from them
+_userproxy_app_sources: dict[Any, set[int]] = {}
+
+
+def _evict_userproxy_apps(document_id: Any) -> None:
+    for application_id in _userproxy_app_sources.pop(document_id, set()):
+        _userproxy_apps.pop(application_id, None)
+
+
+# ? public keys and group accounts can change on any replica
+invalidator.register('members', _evict_userproxy_apps)
+invalidator.register('groups', _evict_userproxy_apps)
+
+
+@lru_cache(maxsize=4096)
+def _verify_key(public_key: str) -> VerifyKey:
+    return VerifyKey(bytes.fromhex(public_key))
+
+
+def _verify(
+    verify_key: VerifyKey,
+    timestamp: str,
+    body: bytes,
+    signature: str
+) -> bool:
+    try:
+        verify_key.verify(
+            timestamp.encode() + body,
+            bytes.fromhex(signature)
+        )
+    except (BadSignatureError, ValueError):
+        return False
+
+    return True
+
+
+async def _userproxy_app(
+    application_id: int,
+    refresh: bool = False
+) -> UserproxyApp:
+    app = _userproxy_apps.get(application_id)
+    now = monotonic()
+
+    if app is not None and (
+        now - app.loaded < USERPROXY_APP_REFRESH_INTERVAL
+        if refresh else
+        app.expires > now
+    ):
+        return app
+
+    member = await ProxyMember.find_one({'userproxy.bot_id': application_id})
+
+    if member is None or member.userproxy is None:
+        _userproxy_apps.pop(application_id, None)
+        userproxy_command_names.pop(application_id, None)
+        raise HTTPException(400, 'Invalid application id')
+
+    # ? dispatch maps the custom proxy command name without loading the member again
+    remember_userproxy_command(member)
+
+    group = await member.get_group()
+
+    app = UserproxyApp(
+        verify_key=_verify_key(member.userproxy.public_key),
+        accounts=frozenset(group.accounts),
+        loaded=now,
+        expires=now + USERPROXY_APP_TTL
+    )
+
+    _userproxy_apps[application_id] = app
+
+    for document_id in (member.id, group.id):
+        _userproxy_app_sources.setdefault(document_id, set()).add(application_id)
+
+    return app
+
+
 async def discord_key_validator(
     request: Request,
     x_signature_ed25519: Annotated[str, Header()],
     x_signature_timestamp: Annotated[str, Header()],
-) -> bool:
+) -> Interaction:
+    # ? the body is parsed once, signature checks only need the application id
     try:
-        request_body = (await request.body()).decode()
-        interaction = Interaction.model_validate_json(request_body)
+        request_body = await request.body()
+        payload = loads(request_body)
+        application_id = int(payload['application_id'])
     except Exception:
         raise HTTPException(400, 'Invalid request body')
 
-    member = None
-    match interaction.application_id:
-        case project.application_id:
-            verify_key = VerifyKey(bytes.fromhex(project.bot_public_key))
-        case _:
-            member = await ProxyMember.find_one({'userproxy.bot_id': interaction.application_id})
-
-            if member is None or member.userproxy is None:
-                raise HTTPException(400, 'Invalid application id')
-
-            verify_key = VerifyKey(bytes.fromhex(member.userproxy.public_key))
+    app = None
+    if application_id == project.application_id:
+        verified = _verify(
+            _verify_key(project.bot_public_key),
+            x_signature_timestamp, request_body, x_signature_ed25519)
+    else:
+        app = await _userproxy_app(application_id)
+        verified = _verify(
+            app.verify_key,
+            x_signature_timestamp, request_body, x_signature_ed25519)
+
+        if not verified:  # ? public key may have been reset since it was cached
+            app = await _userproxy_app(application_id, refresh=True)
+            verified = _verify(
+                app.verify_key,
+                x_signature_timestamp, request_body, x_signature_ed25519)
+
+    if not verified:
+        raise HTTPException(401, 'Invalid request signature')
 
     try:
-        verify_key.verify(
-            f'{x_signature_timestamp}{request_body}'.encode(),
-            bytes.fromhex(x_signature_ed25519)
-        )
-    except BadSignatureError:
-        raise HTTPException(401, 'Invalid request signature')
+        interaction = Interaction.model_validate(payload)
+    except Exception:
+        raise HTTPException(400, 'Invalid request body')
 
     if (  # ? always accept pings and interactions directed at the main bot
         interaction.type.value == 1 or
-        interaction.application_id == project.application_id
+        app is None
     ):
-        return True
-
-    assert member is not None
+        return interaction
 
     user_id = (
         int(
@@ -131,10 +229,14 @@ async def discord_key_validator(
         None
     )
 
-    if user_id is None or user_id not in (await member.get_group()).accounts:
+    if user_id is not None and user_id not in app.accounts:
+        # ? account may have been added to the group since it was cached
+        app = await _userproxy_app(application_id, refresh=True)
+
+    if user_id is None or user_id not in app.accounts:
         raise HTTPException(401, 'Invalid user id')
 
-    return True
+    return interaction
 
 
 async def gateway_key_validator(
@@ -147,7 +249,7 @@ async def gateway_key_validator(
     except Exception:
         raise HTTPException(400, 'Invalid request body')
 
-    verify_key = VerifyKey(bytes.fromhex(project.gateway_key))
+    verify_key = _verify_key(project.gateway_key)
 
     try:
         verify_key.verify(
@@ -158,3 +260,13 @@ async def gateway_key_validator(
         raise HTTPException(401, 'Invalid request signature')
 
     return True
+
+
+def verify_gateway_signature(
+    timestamp: str,
+    body: bytes,
+    signature: str
+) -> bool:
+    return _verify(
+        _verify_key(project.gateway_key),
+        timestamp, body, signature)
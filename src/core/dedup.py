@@ -0,0 +1,80 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from collections.abc import Hashable
+from time import monotonic
+import logfire
+
+
+@dataclass
+class DedupStats:
+    hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    evicted: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class DedupWindow:
+    # ? only the hash of each key and the time it was first seen are kept,
+    # ? insertion order is time order so expiry only ever looks at the front
+    def __init__(self, window: float, max_entries: int) -> None:
+        self.window = window
+        self.max_entries = max_entries
+        self.stats = DedupStats()
+        self._seen: OrderedDict[int, float] = OrderedDict()
+        self._hits = logfire.metric_counter(
+            'event_dedup_hits', unit='1',
+            description='redelivered events dropped by the dedup window')
+        self._misses = logfire.metric_counter(
+            'event_dedup_misses', unit='1',
+            description='events seen for the first time by the dedup window')
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def _expire(self, now: float) -> None:
+        cutoff = now - self.window
+
+        while self._seen:
+            key, seen_at = next(iter(self._seen.items()))
+
+            if seen_at > cutoff:
+                break
+
+            del self._seen[key]
+            self.stats.expired += 1
+
+        while len(self._seen) >= self.max_entries:
+            self._seen.popitem(last=False)
+            self.stats.evicted += 1
+
+    def check(self, key: Hashable) -> bool:
+        """returns True if the key was marked within the window, without recording it"""
+        seen_at = self._seen.get(hash(key))
+
+        if seen_at is not None and monotonic() - seen_at < self.window:
+            self.stats.hits += 1
+            self._hits.add(1)
+            return True
+
+        self.stats.misses += 1
+        self._misses.add(1)
+        return False
+
+    def mark(self, key: Hashable) -> None:
+        """records the key, only once the event has actually been handed off, so a failed
+        delivery is still processed when it's retried"""
+        now = monotonic()
+        hashed = hash(key)
+
+        self._expire(now)
+        self._seen[hashed] = now
+        self._seen.move_to_end(hashed)
+
+
+# ? six hours of peak gateway traffic, ~100 bytes per entry
+event_dedup = DedupWindow(window=6 * 60 * 60, max_entries=1_000_000)
@@ -0,0 +1,191 @@
+from asyncio import Task, Condition, TimerHandle, CancelledError, create_task, get_event_loop, wait
+from collections.abc import Callable, Coroutine
+from dataclasses import dataclass
+from typing import Any, NamedTuple
+from enum import StrEnum
+import logfire
+
+
+class TaskClass(StrEnum):
+    EVENT = 'event'
+    INTERACTION = 'interaction'
+    CACHE = 'cache'
+    EMOJI_CLEANUP = 'emoji_cleanup'
+    MESSAGE_CLEANUP = 'message_cleanup'
+    WEBHOOK_CLEANUP = 'webhook_cleanup'
+    JOB = 'job'
+
+
+class SupervisorClosing(RuntimeError):
+    pass
+
+
+class TaskLimit(NamedTuple):
+    concurrency: int
+    backlog: int
+
+
+@dataclass
+class TaskStats:
+    started: int = 0
+    completed: int = 0
+    failed: int = 0
+    dropped: int = 0
+    pending: int = 0
+    running: int = 0
+
+
+TASK_LIMITS: dict[TaskClass, TaskLimit] = {
+    TaskClass.EVENT: TaskLimit(256, 4096),
+    TaskClass.INTERACTION: TaskLimit(256, 2048),
+    TaskClass.CACHE: TaskLimit(64, 2048),
+    TaskClass.EMOJI_CLEANUP: TaskLimit(16, 1024),
+    TaskClass.MESSAGE_CLEANUP: TaskLimit(16, 1024),
+    TaskClass.WEBHOOK_CLEANUP: TaskLimit(8, 256),
+    TaskClass.JOB: TaskLimit(4, 64),
+}
+
+
+class TaskSupervisor:
+    def __init__(self, limits: dict[TaskClass, TaskLimit]) -> None:
+        self.limits = limits
+        self.stats = {task_class: TaskStats() for task_class in limits}
+        self._running = {task_class: Condition() for task_class in limits}
+        self._backlog = {task_class: Condition() for task_class in limits}
+        self._tasks: set[Task] = set()
+        self._timers: dict[TimerHandle, tuple[TaskClass, Callable[[], Coroutine[Any, Any, Any]]]] = {}
+        self._closing = False
+
+    def _start(
+        self,
+        task_class: TaskClass,
+        coro: Coroutine[Any, Any, Any]
+    ) -> Task:
+        self.stats[task_class].pending += 1
+        self.stats[task_class].started += 1
+
+        task = create_task(self._supervise(task_class, coro))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        return task
+
+    async def _supervise(
+        self,
+        task_class: TaskClass,
+        coro: Coroutine[Any, Any, Any]
+    ) -> None:
+        stats = self.stats[task_class]
+        running = self._running[task_class]
+
+        try:
+            async with running:
+                await running.wait_for(
+                    lambda: stats.running < self.limits[task_class].concurrency)
+                stats.running += 1
+
+            try:
+                await coro
+            finally:
+                stats.running -= 1
+                async with running:
+                    running.notify()
+        except CancelledError:
+            raise
+        except Exception as e:
+            stats.failed += 1
+            logfire.error(
+                'background task failed ({task_class})',
+                task_class=task_class.value,
+                _exc_info=e
+            )
+        else:
+            stats.completed += 1
+        finally:
+            coro.close()  # ? no-op unless cancelled before it started
+            stats.pending -= 1
+            async with self._backlog[task_class]:
+                self._backlog[task_class].notify()
+
+    def spawn(
+        self,
+        task_class: TaskClass,
+        coro: Coroutine[Any, Any, Any]
+    ) -> Task | None:
+        # ? never blocks, work is dropped once the task class backlog is full
+        stats = self.stats[task_class]
+
+        if self._closing or stats.pending >= self.limits[task_class].backlog:
+            coro.close()
+            stats.dropped += 1
+            logfire.warn(
+                'dropped background task ({task_class}), backlog full',
+                task_class=task_class.value
+            )
+            return None
+
+        return self._start(task_class, coro)
+
+    async def submit(
+        self,
+        task_class: TaskClass,
+        coro: Coroutine[Any, Any, Any]
+    ) -> Task:
+        # ? waits for room in the task class backlog, pushing back on the caller.
+        # ? raises once draining has started, so callers can hand the work back instead of losing it
+        stats = self.stats[task_class]
+        backlog = self._backlog[task_class]
+
+        async with backlog:
+            await backlog.wait_for(
+                lambda: self._closing or stats.pending < self.limits[task_class].backlog)
+
+        if self._closing:
+            coro.close()
+            raise SupervisorClosing(f'not accepting {task_class.value} tasks, shutting down')
+
+        return self._start(task_class, coro)
+
+    def call_later(
+        self,
+        delay: float,
+        task_class: TaskClass,
+        factory: Callable[[], Coroutine[Any, Any, Any]]
+    ) -> None:
+        def fire() -> None:
+            self._timers.pop(handle, None)
+            self.spawn(task_class, factory())
+
+        handle = get_event_loop().call_later(delay, fire)
+        self._timers[handle] = (task_class, factory)
+
+    async def drain(self, timeout: float = 10) -> None:
+        # ? run delayed work now instead of losing it, then wait for everything to finish
+        for handle, (task_class, factory) in list(self._timers.items()):
+            handle.cancel()
+            self._start(task_class, factory())
+
+        self._timers.clear()
+        self._closing = True
+
+        # ? wakes submitters waiting on a full backlog so they can be turned away
+        for backlog in self._backlog.values():
+            async with backlog:
+                backlog.notify_all()
+
+        if self._tasks:
+            _, pending = await wait(self._tasks, timeout=timeout)
+
+            for task in pending:
+                task.cancel()
+
+        logfire.info(
+            'background tasks drained',
+            tasks={
+                task_class.value: vars(stats)
+                for task_class, stats in self.stats.items()
+            }
+        )
+
+
+supervisor = TaskSupervisor(TASK_LIMITS)
@@ -3,6 +3,12 @@ from .userproxy_interaction import UserProxyInteraction
 from .group_share import GroupShare
 from .helpers import ImageExtension
 from .cfcdnproxy import CFCDNProxy
+from .proxy_profile import ProxyProfile
+from .deletion_job import DeletionJob
+from .command_fingerprint import CommandFingerprint
+from .userproxy_sync_job import UserProxySyncJob
+from .invalidation import invalidator
+from .blobs import GridFSBlobStore, blob_store
 from .httpcache import HTTPCache
 from .api_token import ApiToken
 from .member import ProxyMember
@@ -18,6 +24,27 @@ from .reply import Reply
 from logfire import span
 
 
+DOCUMENT_MODELS = [
+    UserProxyInteraction,
+    ProxyProfile,
+    DeletionJob,
+    CommandFingerprint,
+    UserProxySyncJob,
+    ProxyMember,
+    CFCDNProxy,
+    GroupShare,
+    HTTPCache,
+    ApiToken,
+    Webhook,
+    Message,
+    ApiKey,
+    Group,
+    Image,
+    Latch,
+    Reply,
+]
+
+
 class MongoDatabase:
     def __init__(self, mongo_uri: str) -> None:
         self._client: AsyncIOMotorDatabase = AsyncIOMotorClient(
@@ -26,27 +53,18 @@ class MongoDatabase:
     async def _init_beanie(self) -> None:
         await init_beanie(
             self._client,
-            document_models=[
-                UserProxyInteraction,
-                ProxyMember,
-                CFCDNProxy,
-                GroupShare,
-                HTTPCache,
-                ApiToken,
-                Webhook,
-                Message,
-                ApiKey,
-                Group,
-                Image,
-                Latch,
-                Reply,
-            ]
+            document_models=DOCUMENT_MODELS
         )
 
     async def connect(self) -> None:
         if project.logfire_token:
             with span('MongoDB init'):
                 await self._init_beanie()
-            return
+        else:
+            await self._init_beanie()
+
+        if isinstance(blob_store, GridFSBlobStore):
+            blob_store.init(self._client)
 
-        await self._init_beanie()
+        # ? falls back to the cache ttls when change streams aren't supported
+        invalidator.start(self._client, DOCUMENT_MODELS)
@@ -0,0 +1,361 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket
+from asyncio import Task, CancelledError, create_task, sleep, to_thread
+from fastapi.responses import Response, StreamingResponse
+from collections.abc import AsyncIterator
+from src.models import project, BlobBackend
+from abc import ABC, abstractmethod
+from time import time, perf_counter
+from typing import NamedTuple
+from gridfs.errors import NoFile
+from fastapi import Request
+from hashlib import sha256
+from pathlib import Path
+import logfire
+
+
+class BlobInfo(NamedTuple):
+    key: str
+    size: int
+    created: float
+
+
+class BlobStore(ABC):
+    # ? blobs are content addressed, the key is the sha256 of the data and doubles as the etag
+    def __init__(self, chunk_size: int) -> None:
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def key_for(data: bytes) -> str:
+        return sha256(data).hexdigest()
+
+    @abstractmethod
+    async def put(self, data: bytes) -> str:
+        ...
+
+    @abstractmethod
+    async def stat(self, key: str) -> BlobInfo | None:
+        ...
+
+    @abstractmethod
+    def read(
+        self,
+        key: str,
+        start: int = 0,
+        end: int | None = None
+    ) -> AsyncIterator[bytes]:
+        """yields chunks from start up to, but not including, end"""
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def list_blobs(self) -> AsyncIterator[BlobInfo]:
+        ...
+
+
+class FilesystemBlobStore(BlobStore):
+    def __init__(self, path: str, chunk_size: int) -> None:
+        super().__init__(chunk_size)
+        self.path = Path(path)
+
+    def _path(self, key: str) -> Path:
+        return self.path / key[:2] / key
+
+    async def put(self, data: bytes) -> str:
+        key = self.key_for(data)
+        path = self._path(key)
+
+        def write() -> None:
+            if path.exists():
+                # ? a reused blob is as good as new, the sweeper's grace period starts over
+                path.touch()
+                return
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # ? written to a temporary file first so readers never see partial blobs
+            temp = path.with_suffix('.tmp')
+            temp.write_bytes(data)
+            temp.replace(path)
+
+        await to_thread(write)
+
+        return key
+
+    async def stat(self, key: str) -> BlobInfo | None:
+        try:
+            stat = await to_thread(self._path(key).stat)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        return BlobInfo(key, stat.st_size, stat.st_mtime)
+
+    async def read(
+        self,
+        key: str,
+        start: int = 0,
+        end: int | None = None
+    ) -> AsyncIterator[bytes]:
+        file = await to_thread(self._path(key).open, 'rb')
+
+        try:
+            await to_thread(file.seek, start)
+            remaining = None if end is None else end - start
+
+            while remaining is None or remaining > 0:
+                chunk = await to_thread(
+                    file.read,
+                    self.chunk_size
+                    if remaining is None else
+                    min(self.chunk_size, remaining)
+                )
+
+                if not chunk:
+                    break
+
+                if remaining is not None:
+                    remaining -= len(chunk)
+
+                yield chunk
+        finally:
+            await to_thread(file.close)
+
+    async def delete(self, key: str) -> None:
+        await to_thread(self._path(key).unlink, True)
+
+    async def list_blobs(self) -> AsyncIterator[BlobInfo]:
+        def scan() -> list[BlobInfo]:
+            if not self.path.exists():
+                return []
+
+            return [
+                BlobInfo(path.name, (stat := path.stat()).st_size, stat.st_mtime)
+                for path in self.path.glob('??/*')
+                if path.suffix != '.tmp'
+            ]
+
+        for info in await to_thread(scan):
+            yield info
+
+
+class GridFSBlobStore(BlobStore):
+    def __init__(self, chunk_size: int) -> None:
+        super().__init__(chunk_size)
+        self._database: AsyncIOMotorDatabase | None = None
+        self._bucket: AsyncIOMotorGridFSBucket | None = None
+
+    def init(self, database: AsyncIOMotorDatabase) -> None:
+        self._database = database
+        self._bucket = AsyncIOMotorGridFSBucket(
+            database,
+            bucket_name='blobs',
+            chunk_size_bytes=self.chunk_size)
+
+    @property
+    def bucket(self) -> AsyncIOMotorGridFSBucket:
+        if self._bucket is None:
+            raise RuntimeError('gridfs blob store used before the database was connected')
+
+        return self._bucket
+
+    async def put(self, data: bytes) -> str:
+        key = self.key_for(data)
+
+        assert self._database is not None
+
+        # ? a reused blob is as good as new, the sweeper's grace period starts over
+        result = await self._database['blobs.files'].update_one(
+            {'_id': key}, {'$currentDate': {'uploadDate': True}})
+
+        if not result.matched_count:
+            await self.bucket.upload_from_stream_with_id(key, key, data)
+
+        return key
+
+    async def stat(self, key: str) -> BlobInfo | None:
+        assert self._database is not None
+
+        file = await self._database['blobs.files'].find_one(
+            {'_id': key}, {'length': 1, 'uploadDate': 1})
+
+        if file is None:
+            return None
+
+        return BlobInfo(key, file['length'], file['uploadDate'].timestamp())
+
+    async def read(
+        self,
+        key: str,
+        start: int = 0,
+        end: int | None = None
+    ) -> AsyncIterator[bytes]:
+        stream = await self.bucket.open_download_stream(key)
+        stream.seek(start)
+        remaining = (end if end is not None else stream.length) - start
+
+        while remaining > 0:
+            chunk: bytes = await stream.read(min(self.chunk_size, remaining))
+
+            if not chunk:
+                break
+
+            remaining -= len(chunk)
+            yield chunk
+
+    async def delete(self, key: str) -> None:
+        try:
+            await self.bucket.delete(key)
+        except NoFile:
+            pass
+
+    async def list_blobs(self) -> AsyncIterator[BlobInfo]:
+        assert self._database is not None
+
+        async for file in self._database['blobs.files'].find(
+            {}, {'length': 1, 'uploadDate': 1}
+        ):
+            yield BlobInfo(file['_id'], file['length'], file['uploadDate'].timestamp())
+
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None:
+    # ? only single byte ranges are supported, end is exclusive
+    unit, _, spec = header.partition('=')
+
+    if unit.strip() != 'bytes' or ',' in spec:
+        return None
+
+    first, _, last = spec.strip().partition('-')
+
+    try:
+        if not first:  # ? suffix range, the last n bytes
+            length = int(last)
+            return (max(size - length, 0), size) if length > 0 else None
+
+        start = int(first)
+        end = min(int(last) + 1, size) if last else size
+    except ValueError:
+        return None
+
+    return (start, end) if start < end else None
+
+
+async def blob_response(
+    request: Request,
+    key: str,
+    media_type: str | None,
+    max_age: int = 60 * 60 * 24
+) -> Response:
+    info = await blob_store.stat(key)
+
+    if info is None:
+        return Response(status_code=404)
+
+    headers = {
+        'ETag': f'"{key}"',
+        'Cache-Control': f'public, max-age={max_age}, immutable',
+        'Accept-Ranges': 'bytes'
+    }
+
+    if request.headers.get('if-none-match') == headers['ETag']:
+        return Response(status_code=304, headers=headers)
+
+    start, end, status = 0, info.size, 200
+
+    if (range_header := request.headers.get('range')) is not None:
+        byte_range = _parse_range(range_header, info.size)
+
+        if byte_range is None or byte_range[0] >= info.size:
+            return Response(
+                status_code=416,
+                headers={**headers, 'Content-Range': f'bytes */{info.size}'})
+
+        start, end = byte_range
+        status = 206
+        headers['Content-Range'] = f'bytes {start}-{end - 1}/{info.size}'
+
+    headers['Content-Length'] = str(end - start)
+
+    return StreamingResponse(
+        blob_store.read(key, start, end),
+        status_code=status,
+        media_type=media_type,
+        headers=headers
+    )
+
+
+class BlobSweeper:
+    # ? blobs are shared between documents, so they're deleted once nothing references them
+    GRACE_PERIOD = 10 * 60
+
+    def __init__(self, interval: int) -> None:
+        self.interval = interval
+        self._task: Task | None = None
+
+    async def sweep(self) -> int:
+        from src.db.cfcdnproxy import CFCDNProxy
+        from src.db.image import Image
+
+        started = perf_counter()
+        referenced = {
+            *await CFCDNProxy.distinct('blob'),
+            *await Image.distinct('blob')
+        }
+
+        deleted = 0
+        async for info in blob_store.list_blobs():
+            if info.key in referenced or time() - info.created < self.GRACE_PERIOD:
+                continue
+
+            # ? the blob may have been reused since the references were read
+            if (
+                (current := await blob_store.stat(info.key)) is None or
+                time() - current.created < self.GRACE_PERIOD or
+                await CFCDNProxy.find_one({'blob': info.key}, ignore_cache=True) is not None or
+                await Image.find_one({'blob': info.key}, ignore_cache=True) is not None
+            ):
+                continue
+
+            await blob_store.delete(info.key)
+            deleted += 1
+
+        logfire.info(
+            'swept {deleted} unreferenced blobs',
+            deleted=deleted,
+            duration=perf_counter() - started
+        )
+
+        return deleted
+
+    async def _run(self) -> None:
+        while True:
+            await sleep(self.interval)
+
+            try:
+                await self.sweep()
+            except Exception as e:
+                logfire.error('blob sweep failed', _exc_info=e)
+
+    def start(self) -> None:
+        self._task = create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+
+        try:
+            await self._task
+        except CancelledError:
+            pass
+
+        self._task = None
+
+
+blob_store: BlobStore = (
+    GridFSBlobStore(project.blobs.chunk_size)
+    if project.blobs.backend == BlobBackend.GRIDFS else
+    FilesystemBlobStore(project.blobs.path, project.blobs.chunk_size)
+)
+blob_sweeper = BlobSweeper(project.blobs.sweep_interval)
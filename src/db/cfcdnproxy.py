@@ -18,13 +18,20 @@ class CFCDNProxy(Document):
         validate_on_save = True
         cache_expiration_time = timedelta(seconds=120)
         indexes = [
-            IndexModel('ts', expireAfterSeconds=300)
+            IndexModel('ts', expireAfterSeconds=300),
+            'blob'
         ]
 
     id: PydanticObjectId = Field(  # type: ignore
         default_factory=PydanticObjectId)
     target_url: str = Field(description='the url of the image')
-    data: bytes = Field(description='the image data')
+    blob: str | None = Field(
+        None, description='the blob store key of the image data')
+    size: int = Field(0, description='the size of the image data in bytes')
+    data: bytes | None = Field(
+        None, description='the image data of proxies created before the blob store; expire on their own')
+    content_type: str | None = Field(
+        None, description='the mime type of the image')
     ts: datetime = Field(
         default_factory=datetime.utcnow,
         description='timestamp for the image; used for ttl')
@@ -0,0 +1,40 @@
+from __future__ import annotations
+from datetime import datetime
+from beanie import Document
+from pydantic import Field
+
+
+class CommandFingerprint(Document):
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, type(self)) and self.id == other.id
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+    class Settings:
+        name = 'command_fingerprints'
+        validate_on_save = True
+
+    id: int = Field(description='the application id')  # type: ignore
+    fingerprint: str | None = Field(
+        None,
+        description='hash of the registration payload last synced to discord')
+    profile: str | None = Field(
+        None,
+        description='hash of the userproxy profile last synced to discord')
+    ts: datetime = Field(
+        default_factory=datetime.utcnow,
+        description='when the commands were last synced')
+
+    @classmethod
+    async def record(
+        cls,
+        application_id: int,
+        **fingerprints: str
+    ) -> None:
+        # ? commands and profiles are synced separately, neither should clobber the other
+        await cls.get_motor_collection().update_one(
+            {'_id': application_id},
+            {'$set': {**fingerprints, 'ts': datetime.utcnow()}},
+            upsert=True
+        )
@@ -0,0 +1,335 @@
+from __future__ import annotations
+from .userproxy_interaction import UserProxyInteraction
+from asyncio import CancelledError, Semaphore, gather, sleep
+from .userproxy_sync_job import JOB_OWNER
+from beanie import Document, PydanticObjectId
+from .proxy_profile import ProxyProfile
+from datetime import datetime, timedelta
+from .member import ProxyMember
+from pymongo.errors import DuplicateKeyError
+from .helpers import _delete_image
+from .message import Message
+from pydantic import Field
+from typing import Any, ClassVar
+from .group import Group
+from .latch import Latch
+from enum import StrEnum
+import logfire
+
+
+class DeletionPhase(StrEnum):
+    DOCUMENTS = 'documents'
+    AVATARS = 'avatars'
+
+
+class DeletionJob(Document):
+    # ? avatars are deleted in batches, progress is saved between them so restarts pick up where they left off
+    AVATAR_BATCH_SIZE: ClassVar[int] = 32
+    AVATAR_CONCURRENCY: ClassVar[int] = 8
+    AVATAR_ATTEMPTS: ClassVar[int] = 3
+    # ? only the replica holding the lease runs a job, it's renewed after every batch
+    LEASE: ClassVar[timedelta] = timedelta(minutes=10)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, type(self)) and self.id == other.id
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+    class Settings:
+        name = 'deletion_jobs'
+        validate_on_save = True
+
+    id: int = Field(description='the discord account id being deleted')  # type: ignore
+    phase: DeletionPhase = Field(
+        DeletionPhase.DOCUMENTS,
+        description='the current phase of the job')
+    application_id: int = Field(
+        description='the application id of the interaction that started the job')
+    token: str = Field(
+        description='the interaction token, used to report progress')
+    groups: list[PydanticObjectId] = Field(
+        default_factory=list,
+        description='the groups to delete')
+    members: list[PydanticObjectId] = Field(
+        default_factory=list,
+        description='the members to delete')
+    userproxy_ids: list[int] = Field(
+        default_factory=list,
+        description='the bot ids of the deleted members\' userproxies')
+    avatars: list[str] = Field(
+        default_factory=list,
+        description='cloudflare image ids that still need to be deleted')
+    total_avatars: int = Field(
+        0, description='the number of avatars when the job started')
+    ts: datetime = Field(
+        default_factory=datetime.utcnow,
+        description='when the job was started')
+    failed: bool = Field(
+        False, description='whether the last run failed, failed jobs can be restarted')
+    owner: str | None = Field(
+        None, description='the replica currently running the job')
+    heartbeat: datetime | None = Field(
+        None, description='when the owner last renewed its lease')
+
+    @classmethod
+    async def start(
+        cls,
+        account_id: int,
+        application_id: int,
+        token: str
+    ) -> DeletionJob | None:
+        """returns None if a job for the account is already running"""
+        now = datetime.utcnow()
+
+        # ? a failed job is taken over by the new interaction and picks up where it stopped
+        if (
+            failed := await cls.get_motor_collection().find_one_and_update(
+                {'_id': account_id, 'failed': True},
+                {'$set': {
+                    'failed': False,
+                    'application_id': application_id,
+                    'token': token,
+                    'ts': now,
+                    'owner': JOB_OWNER,
+                    'heartbeat': now}})
+        ) is not None:
+            return await cls.get(failed['_id'])
+
+        groups = await Group.find_many({'accounts': account_id}).to_list()
+
+        members = await ProxyMember.find_many(
+            {'_id': {'$in': [
+                member_id
+                for group in groups
+                for member_id in group.members]}}
+        ).to_list()
+
+        avatars = [
+            f'{obj.id}_{obj.avatar.id}'
+            for obj in [*groups, *members]
+            if obj.avatar is not None
+        ]
+
+        job = cls(
+            id=account_id,
+            application_id=application_id,
+            token=token,
+            groups=[group.id for group in groups],
+            members=[member.id for member in members],
+            userproxy_ids=list({
+                member.userproxy.bot_id
+                for member in members
+                if member.userproxy is not None}),
+            avatars=avatars,
+            total_avatars=len(avatars),
+            ts=now,
+            owner=JOB_OWNER,
+            heartbeat=now
+        )
+
+        try:
+            return await job.insert()
+        except DuplicateKeyError:
+            return None
+
+    @classmethod
+    async def _claim(cls, account_id: int) -> DeletionJob | None:
+        """takes the lease on an unfailed job, returns None if another replica holds it"""
+        now = datetime.utcnow()
+
+        if await cls.get_motor_collection().find_one_and_update(
+            {
+                '_id': account_id,
+                'failed': False,
+                '$or': [
+                    {'owner': None},
+                    {'owner': JOB_OWNER},
+                    {'heartbeat': {'$lt': now - cls.LEASE}}]
+            },
+            {'$set': {'owner': JOB_OWNER, 'heartbeat': now}}
+        ) is None:
+            return None
+
+        return await cls.get(account_id)
+
+    async def _update_claimed(self, update: dict[str, Any]) -> bool:
+        """applies the update only while this replica still holds the lease, renewing it"""
+        update.setdefault('$set', {})['heartbeat'] = datetime.utcnow()
+
+        result = await self.get_motor_collection().update_one(
+            {'_id': self.id, 'owner': JOB_OWNER}, update)
+
+        return bool(result.matched_count)
+
+    async def _report(
+        self,
+        message: str,
+        done: bool = False,
+        failed: bool = False
+    ) -> None:
+        from src.errors import HTTPException, NotFound, Forbidden, Unauthorized
+        from src.discord import Webhook, WebhookType, Embed, Snowflake
+
+        # ? interaction tokens expire after 15 minutes, resumed jobs may not be able to report
+        if datetime.utcnow() - self.ts > timedelta(minutes=15):
+            return
+
+        try:
+            await Webhook(
+                id=Snowflake(self.application_id),
+                type=WebhookType.APPLICATION,
+                token=self.token
+            ).edit_message(
+                '@original',
+                embeds=[
+                    Embed.error(message)
+                    if failed else
+                    Embed.success(message)
+                    if done else
+                    Embed.warning(message, title='deleting data...')]
+            )
+        except (HTTPException, NotFound, Forbidden, Unauthorized):
+            pass
+
+    async def _delete_documents(self) -> None:
+        from .reply import Reply
+
+        await gather(
+            Group.find({'_id': {'$in': self.groups}}).delete(),
+            ProxyMember.find({'_id': {'$in': self.members}}).delete(),
+            Message.find({'author_id': self.id}).delete(),
+            Reply.find({'bot_id': {'$in': self.userproxy_ids}}).delete(),
+            UserProxyInteraction.find(
+                {'application_id': {'$in': self.userproxy_ids}}).delete(),
+            Latch.find({'user': self.id}).delete()
+        )
+
+        # ? shared groups are removed from the other accounts too
+        other_accounts = {
+            account_id
+            for accounts in await gather(*[
+                ProxyProfile.accounts_with(group_id=group_id)
+                for group_id in self.groups])
+            for account_id in accounts
+        }
+
+        # ? deleted by query, which doesn't trigger the profile rebuild hooks
+        await ProxyProfile.rebuild_many({self.id, *other_accounts})
+
+    async def _delete_avatar(self, image_id: str, semaphore: Semaphore) -> None:
+        from src.errors import NotFound
+
+        async with semaphore:
+            for attempt in range(self.AVATAR_ATTEMPTS):
+                try:
+                    await _delete_image(image_id)
+                except NotFound:
+                    return
+                except Exception as e:
+                    if attempt + 1 == self.AVATAR_ATTEMPTS:
+                        logfire.error(
+                            'failed to delete avatar {image_id}',
+                            image_id=image_id,
+                            _exc_info=e
+                        )
+                        return
+
+                    await sleep(2 ** attempt)
+                else:
+                    return
+
+    async def _delete_avatars(self) -> bool:
+        """returns False if the lease was lost"""
+        semaphore = Semaphore(self.AVATAR_CONCURRENCY)
+
+        while self.avatars:
+            batch = self.avatars[:self.AVATAR_BATCH_SIZE]
+
+            await gather(*[
+                self._delete_avatar(image_id, semaphore)
+                for image_id in batch
+            ])
+
+            self.avatars = self.avatars[len(batch):]
+            if not await self._update_claimed({'$pullAll': {'avatars': batch}}):
+                return False
+
+            await self._report(
+                f'deleted {self.total_avatars - len(self.avatars)}/{self.total_avatars} avatars')
+
+        return True
+
+    async def run(self) -> None:
+        try:
+            await self._run()
+        except CancelledError:
+            # ? shutting down, let the next startup resume it without waiting out the lease
+            await self._update_claimed({'$set': {'owner': None}})
+            raise
+        except Exception as e:
+            logfire.error(
+                'deletion job for {account_id} failed',
+                account_id=self.id,
+                _exc_info=e
+            )
+
+            await self.mark_failed()
+
+            await self._report(
+                'data deletion failed, please try again', failed=True)
+
+    async def mark_failed(self) -> None:
+        # ? kept so progress isn't lost, the next attempt picks up where this one stopped
+        self.failed = True
+        await self._update_claimed({'$set': {'failed': True, 'owner': None}})
+
+    async def _run(self) -> None:
+        if self.phase == DeletionPhase.DOCUMENTS:
+            await self._report('deleting groups, members and messages')
+            await self._delete_documents()
+            self.phase = DeletionPhase.AVATARS
+            if not await self._update_claimed({'$set': {'phase': self.phase.value}}):
+                logfire.warn(
+                    'lost the lease on deletion job for {account_id}, stopping',
+                    account_id=self.id)
+                return
+
+            if self.avatars:
+                await self._report(
+                    f'data deleted, deleting {self.total_avatars} avatars')
+
+        if not await self._delete_avatars():
+            logfire.warn(
+                'lost the lease on deletion job for {account_id}, stopping',
+                account_id=self.id)
+            return
+
+        await self.delete()
+
+        await self._report('all data successfully deleted', done=True)
+
+    @classmethod
+    async def resume_all(cls) -> None:
+        from src.core.supervisor import supervisor, TaskClass
+
+        # ? failed jobs wait for the user to retry, they were told it failed
+        job_ids = [
+            job['_id']
+            async for job in cls.get_motor_collection().find(
+                {'failed': False}, {'_id': 1})
+        ]
+
+        for account_id in job_ids:
+            # ? still running on another replica
+            if (job := await cls._claim(account_id)) is None:
+                continue
+
+            logfire.info(
+                'resuming deletion job for {account_id}',
+                account_id=job.id,
+                phase=job.phase.value
+            )
+
+            if supervisor.spawn(TaskClass.JOB, job.run()) is None:
+                await job.mark_failed()
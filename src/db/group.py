@@ -1,6 +1,6 @@
 from __future__ import annotations
 from .helpers import avatar_getter, avatar_setter, avatar_deleter, ImageId
-from beanie import Document, PydanticObjectId
+from beanie import Document, PydanticObjectId, after_event, Insert, Replace, Save, SaveChanges, Update, Delete
 from pydantic import Field, model_validator
 from src.db.member import ProxyMember
 from datetime import timedelta
@@ -102,6 +102,16 @@ class Group(Document):
 
         return f'{project.images.base_url}/{self.id}/{self.avatar.id}.{self.avatar.extension}'
 
+    @after_event(Insert, Replace, Save, SaveChanges, Update, Delete)
+    async def _rebuild_proxy_profiles(self) -> None:
+        from src.db.proxy_profile import ProxyProfile
+
+        # ? includes accounts that were just removed from the group
+        await ProxyProfile.rebuild_many({
+            *self.accounts,
+            *await ProxyProfile.accounts_with(group_id=self.id)
+        })
+
     async def get_members(self) -> list[ProxyMember]:
         return await ProxyMember.find_many(
             {'_id': {'$in': list(self.members)}}
@@ -127,7 +137,8 @@ class Group(Document):
             name=name,
             avatar=None,
             proxy_tags=[],
-            userproxy=None
+            userproxy=None,
+            group=self.id
         )
 
         self.members.add(member.id)
@@ -97,25 +97,30 @@ async def _get_image_extension(url: str) -> ImageExtension:
                 raise HTTPException('failed to get asset')
 
 
-async def avatar_deleter(self: ProxyMember | Group) -> None:
+async def _delete_image(image_id: str) -> None:
     from src.discord.http import Route, request
 
+    await request(
+        Route(
+            'DELETE',
+            'https://api.cloudflare.com/client/v4/accounts/{account_id}/images/v1/{id}',
+            discord=False,
+            account_id=project.images.account_id,
+            id=image_id),
+        token=project.images.token
+    )
+
+
+async def avatar_deleter(self: ProxyMember | Group) -> None:
     if self.avatar is not None:
-        await request(
-            Route(
-                'DELETE',
-                'https://api.cloudflare.com/client/v4/accounts/{account_id}/images/v1/{id}',
-                discord=False,
-                account_id=project.images.account_id,
-                id=f'{self.id}_{self.avatar.id}'),
-            token=project.images.token
-        )
+        await _delete_image(f'{self.id}_{self.avatar.id}')
 
     self.avatar = None
     await self.save()
 
 
-async def avatar_setter(self: ProxyMember | Group, url: str) -> None:
+async def avatar_uploader(self: ProxyMember | Group, url: str) -> ImageId:
+    """uploads the avatar to cloudflare without touching the document"""
     from src.discord.http import Route, request
 
     avatar = ImageId(await _get_image_extension(url))
@@ -139,12 +144,36 @@ async def avatar_setter(self: ProxyMember | Group, url: str) -> None:
             token=project.images.token
         )
 
+    return avatar
+
+
+async def avatar_setter(self: ProxyMember | Group, url: str) -> None:
+    avatar = await avatar_uploader(self, url)
+
     await avatar_deleter(self)
 
     self.avatar = avatar
     await self.save()
 
 
+async def avatar_initializer(self: ProxyMember | Group, url: str) -> bool:
+    """sets the avatar of a document that has none, without saving a possibly stale copy of it
+
+    returns False if the document was deleted or given an avatar in the meantime"""
+    avatar = await avatar_uploader(self, url)
+
+    result = await type(self).find_one(
+        {'_id': self.id, 'avatar': None}
+    ).update({'$set': {'avatar': bytes(avatar)}})
+
+    if not result.modified_count:
+        await _delete_image(f'{self.id}_{avatar.id}')
+        return False
+
+    self.avatar = avatar
+    return True
+
+
 async def avatar_getter(self: ProxyMember | Group) -> bytes | None:
     from src.discord.http import Route, request
     from src.core.session import session
@@ -1,6 +1,8 @@
 from beanie import Document, PydanticObjectId
 from datetime import timedelta
 from pydantic import Field
+from .blobs import blob_store
+import logfire
 
 
 class Image(Document):
@@ -15,8 +17,32 @@ class Image(Document):
         use_cache = True
         validate_on_save = True
         cache_expiration_time = timedelta(minutes=30)
+        indexes = ['blob']
 
     id: PydanticObjectId = Field(  # type: ignore
         default_factory=PydanticObjectId)
-    data: bytes = Field(description='the binary data of the image')
+    blob: str | None = Field(
+        None, description='the blob store key of the image data')
+    size: int = Field(0, description='the size of the image data in bytes')
     extension: str = Field(description='the file extension of the image')
+
+    @classmethod
+    async def migrate_blobs(cls) -> None:
+        # ? images used to be stored inline, move the data into the blob store
+        collection = cls.get_motor_collection()
+        migrated = 0
+
+        async for image in collection.find({'data': {'$exists': True}}):
+            await collection.update_one(
+                {'_id': image['_id']},
+                {
+                    '$set': {
+                        'blob': await blob_store.put(image['data']),
+                        'size': len(image['data'])},
+                    '$unset': {'data': ''}
+                }
+            )
+            migrated += 1
+
+        if migrated:
+            logfire.info('migrated {count} images to the blob store', count=migrated)
@@ -0,0 +1,193 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure, PyMongoError
+from collections.abc import Callable, Collection, Iterable
+from asyncio import Task, CancelledError, create_task, sleep
+from datetime import timedelta
+from beanie import Document
+from typing import Any
+import logfire
+
+
+# ? while change streams are active, cached documents only expire after this long
+WATCHED_CACHE_EXPIRATION = timedelta(minutes=15)
+# ? replica set required, standalone servers fail with one of these
+UNSUPPORTED_CODES = {40573, 40324, 136}
+# ? queries using these can match on any field, so any change may affect them
+OPAQUE_OPERATORS = ('$where', '$text', '$expr', '$function')
+
+
+def _document_id(document: Any) -> Any:
+    if isinstance(document, dict):
+        return document.get('_id')
+
+    return getattr(document, 'id', None)
+
+
+def _changed_fields(change: dict[str, Any]) -> set[str] | None:
+    match change.get('operationType'):
+        case 'delete':  # ? can only remove the document from lists it was already in
+            return set()
+        case 'update':
+            description = change.get('updateDescription', {})
+
+            return {
+                path.split('.', 1)[0]
+                for path in [
+                    *description.get('updatedFields', {}),
+                    *description.get('removedFields', []),
+                    *(
+                        truncated['field']
+                        for truncated in description.get('truncatedArrays', []))]
+            }
+        case _:
+            return None
+
+
+class CacheInvalidator:
+    def __init__(self) -> None:
+        self._models: dict[str, type[Document]] = {}
+        self._expiration_times: dict[str, timedelta] = {}
+        self._callbacks: dict[str, list[Callable[[Any], None]]] = {}
+        self._task: Task | None = None
+        self.active = False
+
+    def register(
+        self,
+        collection: str,
+        callback: Callable[[Any], None]
+    ) -> None:
+        """called with the _id of every changed document in the collection"""
+        self._callbacks.setdefault(collection, []).append(callback)
+
+    @staticmethod
+    def _affects(
+        key: str,
+        value: Any,
+        document_id: Any,
+        fields: Collection[str] | None
+    ) -> bool:
+        if isinstance(value, list):
+            if any(_document_id(document) == document_id for document in value):
+                return True
+        elif value is not None:
+            return _document_id(value) == document_id
+
+        # ? lists and empty lookups may now match the document, inserts and replacements any of them
+        if fields is None:
+            return True
+
+        # ? beanie keys are the repr of the query, an update can only bring the document
+        # ? into queries that filter or sort on one of the changed fields
+        return any(operator in key for operator in OPAQUE_OPERATORS) or any(
+            f"'{field}" in key or f"'${field}" in key
+            for field in fields
+        )
+
+    def invalidate(
+        self,
+        collection: str,
+        document_id: Any,
+        fields: Collection[str] | None = None
+    ) -> None:
+        """fields are the top level fields an update changed, None if the whole document may have"""
+        model = self._models.get(collection)
+
+        if model is not None and (cache := getattr(model, '_cache', None)) is not None:
+            for key, item in list(cache.cache.items()):
+                if self._affects(key, item.value, document_id, fields):
+                    cache.cache.pop(key, None)
+
+        for callback in self._callbacks.get(collection, []):
+            callback(document_id)
+
+    def _set_expiration(self, active: bool) -> None:
+        self.active = active
+
+        for collection, model in self._models.items():
+            if (cache := getattr(model, '_cache', None)) is None:
+                continue
+
+            cache.expiration_time = (
+                max(WATCHED_CACHE_EXPIRATION, self._expiration_times[collection])
+                if active else
+                self._expiration_times[collection]
+            )
+
+    async def _watch(self, database: AsyncIOMotorDatabase) -> None:
+        resume_token = None
+
+        while True:
+            try:
+                async with database.watch(
+                    [{'$match': {'ns.coll': {'$in': sorted({*self._models, *self._callbacks})}}}],
+                    resume_after=resume_token
+                ) as stream:
+                    self._set_expiration(True)
+                    logfire.info('watching collections for cache invalidation')
+
+                    async for change in stream:
+                        resume_token = stream.resume_token
+
+                        if (document_key := change.get('documentKey')) is None:
+                            continue
+
+                        self.invalidate(
+                            change['ns']['coll'],
+                            document_key['_id'],
+                            _changed_fields(change))
+            except OperationFailure as e:
+                self._set_expiration(False)
+
+                if e.code in UNSUPPORTED_CODES:
+                    logfire.warn(
+                        'change streams unavailable, falling back to cache ttl')
+                    return
+
+                # ? resume token may have fallen off the oplog, caches can't be trusted
+                resume_token = None
+                self._clear()
+                logfire.error('cache invalidation stream failed', _exc_info=e)
+            except PyMongoError as e:
+                self._set_expiration(False)
+                self._clear()
+                logfire.error('cache invalidation stream failed', _exc_info=e)
+
+            await sleep(5)
+
+    def _clear(self) -> None:
+        for model in self._models.values():
+            if (cache := getattr(model, '_cache', None)) is not None:
+                cache.cache.clear()
+
+    def start(
+        self,
+        database: AsyncIOMotorDatabase,
+        models: Iterable[type[Document]]
+    ) -> None:
+        for model in models:
+            settings = model.get_settings()
+
+            if not settings.use_cache or settings.name is None:
+                continue
+
+            self._models[settings.name] = model
+            self._expiration_times[settings.name] = settings.cache_expiration_time
+
+        self._task = create_task(self._watch(database))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+
+        try:
+            await self._task
+        except CancelledError:
+            pass
+
+        self._task = None
+        self._set_expiration(False)
+
+
+invalidator = CacheInvalidator()
@@ -1,4 +1,4 @@
-from beanie import Document, PydanticObjectId
+from beanie import Document, PydanticObjectId, after_event, Insert, Replace, Save, SaveChanges, Update, Delete
 from .member import ProxyMember
 from pydantic import Field
 
@@ -26,6 +26,12 @@ class Latch(Document):
     member: PydanticObjectId | None = Field(
         description='the latched member id')
 
+    @after_event(Insert, Replace, Save, SaveChanges, Update, Delete)
+    async def _rebuild_proxy_profile(self) -> None:
+        from src.db.proxy_profile import ProxyProfile
+
+        await ProxyProfile.rebuild(self.user)
+
     async def get_member(self) -> ProxyMember:
         member = await ProxyMember.find_one({'id': self.member})
         assert member is not None
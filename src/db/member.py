@@ -2,7 +2,7 @@ from __future__ import annotations
 from .helpers import avatar_getter, avatar_setter, avatar_deleter, ImageId
 from pydantic import Field, model_validator, BaseModel
 from typing import Annotated, TYPE_CHECKING, Any
-from beanie import Document, PydanticObjectId
+from beanie import Document, PydanticObjectId, after_event, Insert, Replace, Save, SaveChanges, Update, Delete
 from datetime import timedelta
 from re import sub, IGNORECASE
 
@@ -44,7 +44,7 @@ class ProxyMember(Document):
         validate_on_save = True
         use_state_management = True
         cache_expiration_time = timedelta(seconds=5)
-        indexes = ['userproxy.bot_id']
+        indexes = ['userproxy.bot_id', 'group']
         bson_encoders = {ImageId: bytes}
 
     class ProxyTag(BaseModel):
@@ -99,6 +99,10 @@ class ProxyMember(Document):
         None,
         description='the userproxy information'
     )
+    group: PydanticObjectId | None = Field(
+        None,
+        description='the id of the group the member is in'
+    )
 
     @property
     def avatar_url(self) -> str | None:
@@ -109,16 +113,68 @@ class ProxyMember(Document):
 
         return f'{project.images.base_url}/{self.id}/{self.avatar.id}.{self.avatar.extension.name.lower()}'
 
+    @after_event(Insert, Replace, Save, SaveChanges, Update, Delete)
+    async def _rebuild_proxy_profiles(self) -> None:
+        from src.db.proxy_profile import ProxyProfile
+        from src.db.group import Group
+
+        groups = await Group.find_many(
+            {'members': self.id},
+            ignore_cache=True
+        ).to_list()
+
+        await ProxyProfile.rebuild_many({
+            *(account for group in groups for account in group.accounts),
+            *await ProxyProfile.accounts_with(member_id=self.id)
+        })
+
     async def get_group(self) -> Group:
         from src.db.group import Group
 
+        if self.group is not None:
+            group = await Group.get(self.group)
+
+            if group is not None and self.id in group.members:
+                return group
+
+        # ? members saved before the group reference existed, or out of sync
         group = await Group.find_one({'members': self.id})
 
         if group is None:
             raise ValueError(f'member {self.id} is not in any group')
 
+        self.group = group.id
+        await ProxyMember.find({'_id': self.id}).update(
+            {'$set': {'group': group.id}})
+
         return group
 
+    @classmethod
+    async def backfill_groups(cls) -> None:
+        from src.db.projections import GroupNameProjection, MemberIdProjection
+        from src.db.group import Group
+
+        # ? only members that were never resolved, so once migrated this is a single indexed query
+        missing = {
+            member.id
+            async for member in cls.find(
+                {'group': None},
+                projection_model=MemberIdProjection,
+                ignore_cache=True)
+        }
+
+        if not missing:
+            return
+
+        async for group in Group.find(
+            {'members': {'$in': list(missing)}},
+            projection_model=GroupNameProjection,
+            ignore_cache=True
+        ):
+            await cls.find(
+                {'_id': {'$in': list(missing & set(group.members))}, 'group': None}
+            ).update({'$set': {'group': group.id}})
+
     async def get_avatar(self) -> bytes | None:
         return await avatar_getter(self)
 
@@ -0,0 +1,69 @@
+from pydantic import BaseModel, ConfigDict, Field
+from beanie import PydanticObjectId
+from .member import ProxyMember
+
+
+# ? read-only views for hot paths, skipping the document validators and unused fields
+
+
+class GroupIdProjection(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    class Settings:
+        projection = {'_id': 1}
+
+    id: PydanticObjectId = Field(alias='_id')
+
+
+class GroupAccountsProjection(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    class Settings:
+        projection = {'_id': 1, 'accounts': 1}
+
+    id: PydanticObjectId = Field(alias='_id')
+    accounts: list[int] = Field(default_factory=list)
+
+
+class GroupNameProjection(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    class Settings:
+        projection = {'_id': 1, 'name': 1, 'members': 1}
+
+    id: PydanticObjectId = Field(alias='_id')
+    name: str
+    members: list[PydanticObjectId] = Field(default_factory=list)
+
+
+class MemberNameProjection(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    class Settings:
+        projection = {'_id': 1, 'name': 1, 'userproxy.bot_id': 1}
+
+    class UserProxy(BaseModel):
+        bot_id: int
+
+    id: PydanticObjectId = Field(alias='_id')
+    name: str
+    userproxy: UserProxy | None = None
+
+
+class MemberIdProjection(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    class Settings:
+        projection = {'_id': 1}
+
+    id: PydanticObjectId = Field(alias='_id')
+
+
+class MemberProxyTagsProjection(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    class Settings:
+        projection = {'_id': 1, 'proxy_tags': 1}
+
+    id: PydanticObjectId = Field(alias='_id')
+    proxy_tags: list[ProxyMember.ProxyTag] = Field(default_factory=list)
@@ -0,0 +1,226 @@
+from __future__ import annotations
+from beanie import Document, PydanticObjectId
+from pydantic import BaseModel, Field
+from collections.abc import Iterable
+from .invalidation import invalidator
+from typing import ClassVar
+from .member import ProxyMember
+from weakref import WeakValueDictionary
+from asyncio import Lock, gather
+from .group import Group
+from .latch import Latch
+
+
+class _RebuildState:
+    # ? rebuilds are serialized per account, requests made during a rebuild coalesce into one more
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.requests = 0
+
+
+_rebuilds: WeakValueDictionary[int, _RebuildState] = WeakValueDictionary()
+
+
+class ProxyProfile(Document):
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, type(self)) and self.id == other.id
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+    class Settings:
+        name = 'proxy_profiles'
+        validate_on_save = True
+        indexes = ['groups.id', 'groups.members.id']
+
+    class MemberEntry(BaseModel):
+        id: PydanticObjectId = Field(description='the member id')
+        name: str = Field(description='the name of the member')
+        avatar_url: str | None = Field(
+            None, description='the avatar url of the member')
+        proxy_tags: list[ProxyMember.ProxyTag] = Field(
+            default_factory=list,
+            description='proxy tags for the member')
+        userproxy: bool = Field(
+            False, description='whether the member has a userproxy')
+        userproxy_guilds: list[int] = Field(
+            default_factory=list,
+            description='guilds the member\'s userproxy is enabled in')
+
+    class GroupEntry(BaseModel):
+        id: PydanticObjectId = Field(description='the group id')
+        name: str = Field(description='the name of the group')
+        tag: str | None = Field(None, description='the group tag')
+        avatar_url: str | None = Field(
+            None, description='the avatar url of the group')
+        channels: list[int] = Field(
+            default_factory=list,
+            description='the discord channels this group is restricted to')
+        members: list[ProxyProfile.MemberEntry] = Field(
+            default_factory=list,
+            description='the members of the group')
+
+    class LatchEntry(BaseModel):
+        id: PydanticObjectId = Field(description='the latch id')
+        guild: int | None = Field(description='guild id')
+        enabled: bool = Field(description='whether the latch is enabled')
+        fronting: bool = Field(
+            description='whether the latch is in fronting mode')
+        member: PydanticObjectId | None = Field(
+            description='the latched member id')
+
+    # ? bumped whenever the entries change shape, outdated profiles are rebuilt on fetch
+    VERSION: ClassVar[int] = 1
+
+    id: int = Field(description='discord account id')  # type: ignore
+    version: int = Field(0, description='the profile schema version')
+    groups: list[ProxyProfile.GroupEntry] = Field(
+        default_factory=list,
+        description='every group the account is attached to, with members')
+    latches: list[ProxyProfile.LatchEntry] = Field(
+        default_factory=list,
+        description='the account\'s global and guild latches')
+
+    def get_latch(self, guild_id: int | None) -> ProxyProfile.LatchEntry | None:
+        for latch in self.latches:
+            if latch.guild == guild_id:
+                return latch
+
+        return None
+
+    def get_group_of(
+        self,
+        member_id: PydanticObjectId
+    ) -> ProxyProfile.GroupEntry | None:
+        for group in self.groups:
+            if any(member.id == member_id for member in group.members):
+                return group
+
+        return None
+
+    @classmethod
+    async def _build(cls, account_id: int) -> None:
+        groups, latches = await gather(
+            Group.find_many(
+                {'accounts': account_id},
+                ignore_cache=True
+            ).to_list(),
+            Latch.find_many({'user': account_id}).to_list()
+        )
+
+        if not groups and not latches:
+            # ? kept rather than deleted, otherwise every fetch would rebuild it again
+            await cls(id=account_id, version=cls.VERSION).save()
+            invalidator.invalidate(cls.Settings.name, account_id)
+            return
+
+        members = {
+            member.id: member
+            for member in
+            await ProxyMember.find_many(
+                {'_id': {'$in': [
+                    member_id
+                    for group in groups
+                    for member_id in group.members]}},
+                ignore_cache=True
+            ).to_list()
+        }
+
+        await cls(
+            id=account_id,
+            version=cls.VERSION,
+            groups=[
+                cls.GroupEntry(
+                    id=group.id,
+                    name=group.name,
+                    tag=group.tag,
+                    avatar_url=group.avatar_url,
+                    channels=list(group.channels),
+                    members=[
+                        cls.MemberEntry(
+                            id=member.id,
+                            name=member.name,
+                            avatar_url=member.avatar_url,
+                            proxy_tags=member.proxy_tags,
+                            userproxy=member.userproxy is not None,
+                            userproxy_guilds=(
+                                member.userproxy.guilds
+                                if member.userproxy is not None else
+                                [])
+                        )
+                        for member_id in group.members
+                        if (member := members.get(member_id)) is not None
+                    ]
+                )
+                for group in groups
+            ],
+            latches=[
+                cls.LatchEntry(
+                    id=latch.id,
+                    guild=latch.guild,
+                    enabled=latch.enabled,
+                    fronting=latch.fronting,
+                    member=latch.member
+                )
+                for latch in latches
+            ]
+        ).save()
+
+        # ? lets in-memory views of the profile drop their copy without waiting for the change stream
+        invalidator.invalidate(cls.Settings.name, account_id)
+
+    @classmethod
+    async def rebuild(cls, account_id: int) -> None:
+        state = _rebuilds.get(account_id)
+
+        if state is None:
+            state = _rebuilds[account_id] = _RebuildState()
+
+        state.requests += 1
+
+        async with state.lock:
+            if not state.requests:
+                return  # ? covered by a rebuild that started after this request
+
+            state.requests = 0
+            await cls._build(account_id)
+
+    @classmethod
+    async def rebuild_many(cls, account_ids: Iterable[int]) -> None:
+        await gather(*[
+            cls.rebuild(account_id)
+            for account_id in set(account_ids)
+        ])
+
+    @classmethod
+    async def accounts_with(
+        cls,
+        group_id: PydanticObjectId | None = None,
+        member_id: PydanticObjectId | None = None
+    ) -> set[int]:
+        query = (
+            {'groups.id': group_id}
+            if member_id is None else
+            {'groups.members.id': member_id}
+        )
+
+        return {
+            profile.id
+            for profile in
+            await cls.find_many(query).to_list()
+        }
+
+    @classmethod
+    async def fetch(cls, account_id: int) -> ProxyProfile | None:
+        profile = await cls.get(account_id)
+
+        if profile is None or profile.version < cls.VERSION:
+            # ? built on demand for accounts that predate profiles (or this version of them)
+            await cls.rebuild(account_id)
+            profile = await cls.get(account_id)
+
+        # ? accounts without groups or latches have an empty profile, for callers that's no profile
+        if profile is None or (not profile.groups and not profile.latches):
+            return None
+
+        return profile
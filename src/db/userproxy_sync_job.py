@@ -0,0 +1,335 @@
+from __future__ import annotations
+from .command_fingerprint import CommandFingerprint
+from .projections import MemberIdProjection
+from pymongo.errors import DuplicateKeyError
+from asyncio import CancelledError, Semaphore, gather, sleep
+from beanie import Document, PydanticObjectId
+from collections import Counter, deque
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from .member import ProxyMember
+from src.models import project
+from secrets import token_hex
+from typing import Any, ClassVar
+from pydantic import Field
+from hashlib import sha256
+from time import monotonic
+from enum import StrEnum
+import logfire
+
+
+# ? identifies this replica as the holder of the job lease
+JOB_OWNER = token_hex(8)
+
+
+class SyncResult(StrEnum):
+    SYNCED = 'synced'
+    SKIPPED = 'skipped'
+    FAILED = 'failed'
+
+
+class InvalidRequestLimiter:
+    # ? discord bans ips that make 10,000 invalid requests in 10 minutes, and a fleet
+    # ? sync hits every expired token. the budget leaves plenty for the rest of the bot
+    def __init__(self, budget: int, window: float) -> None:
+        self.budget = budget
+        self.window = window
+        self._requests: deque[float] = deque()
+
+    def note(self) -> None:
+        self._requests.append(monotonic())
+
+    async def wait(self) -> None:
+        while True:
+            now = monotonic()
+
+            while self._requests and now - self._requests[0] > self.window:
+                self._requests.popleft()
+
+            if len(self._requests) < self.budget:
+                return
+
+            await sleep(self.window - (now - self._requests[0]))
+
+
+def _interactions_endpoint_url() -> str:
+    return f'{project.api_url}/discord/interaction'
+
+
+class UserProxySyncJob(Document):
+    # ? one job for the whole fleet, progress is saved between batches so restarts pick
+    # ? up where they left off. the finished job is kept to remember what was synced,
+    # ? and every replica tries to start it but only the lease holder runs it
+    JOB_ID: ClassVar[str] = 'userproxies'
+    BATCH_SIZE: ClassVar[int] = 64
+    # ? each token has its own rate limits, this only bounds the load on us
+    CONCURRENCY: ClassVar[int] = 8
+    INVALID_REQUEST_BUDGET: ClassVar[int] = 1000
+    INVALID_REQUEST_WINDOW: ClassVar[float] = 600
+    # ? only the replica holding the lease runs the job, it's renewed after every batch
+    LEASE: ClassVar[timedelta] = timedelta(minutes=10)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, type(self)) and self.id == other.id
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+    class Settings:
+        name = 'userproxy_sync_jobs'
+        validate_on_save = True
+
+    id: str = Field(description='the job id')  # type: ignore
+    fingerprint: str = Field(
+        '', description='hash of the userproxy command schema and interactions endpoint')
+    members: list[PydanticObjectId] = Field(
+        default_factory=list,
+        description='the members that still need to be synced')
+    total: int = Field(
+        0, description='the number of members when the job started')
+    synced: int = Field(
+        0, description='members with changes synced to discord')
+    skipped: int = Field(
+        0, description='members that were already up to date')
+    failed: int = Field(
+        0, description='members that failed to sync, usually expired tokens')
+    ts: datetime = Field(
+        default_factory=datetime.utcnow,
+        description='when the job was started')
+    finished: datetime | None = Field(
+        None, description='when the job finished')
+    owner: str | None = Field(
+        None, description='the replica currently running the job')
+    heartbeat: datetime | None = Field(
+        None, description='when the owner last renewed its lease')
+
+    @staticmethod
+    def fleet_fingerprint() -> str:
+        from src.discord.commands import userproxy_commands_fingerprint
+
+        return sha256(
+            f'{userproxy_commands_fingerprint()}:{_interactions_endpoint_url()}'.encode()
+        ).hexdigest()
+
+    @staticmethod
+    async def _profile_fingerprint(member: ProxyMember) -> str:
+        assert member.userproxy is not None
+        group = await member.get_group()
+
+        return sha256('\0'.join([
+            _interactions_endpoint_url(),
+            member.name,
+            (group.tag or '') if member.userproxy.include_group_tag else '',
+            str(member.avatar or group.avatar or '')
+        ]).encode()).hexdigest()
+
+    @classmethod
+    async def _claim(cls) -> UserProxySyncJob | None:
+        """takes the job lease, returns None if another replica holds it"""
+        now = datetime.utcnow()
+
+        try:
+            await cls.get_motor_collection().find_one_and_update(
+                {
+                    '_id': cls.JOB_ID,
+                    '$or': [
+                        {'owner': None},
+                        {'owner': JOB_OWNER},
+                        {'heartbeat': {'$lt': now - cls.LEASE}}]
+                },
+                {
+                    '$set': {'owner': JOB_OWNER, 'heartbeat': now},
+                    '$setOnInsert': {'ts': now}
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:  # ? the job exists and the lease is held
+            return None
+
+        return await cls.get(cls.JOB_ID)
+
+    async def _update_claimed(self, update: dict[str, Any]) -> bool:
+        """applies the update only while this replica still holds the lease, renewing it"""
+        update.setdefault('$set', {})['heartbeat'] = datetime.utcnow()
+
+        result = await self.get_motor_collection().update_one(
+            {'_id': self.id, 'owner': JOB_OWNER}, update)
+
+        return bool(result.matched_count)
+
+    @classmethod
+    async def start(cls, force: bool = False) -> UserProxySyncJob | None:
+        """resumes an interrupted fleet sync, or starts one if the schema changed since the last"""
+        if (job := await cls._claim()) is None:
+            logfire.debug('userproxy sync is held by another replica')
+            return None
+
+        fingerprint = cls.fleet_fingerprint()
+
+        if job.fingerprint == fingerprint and not force:
+            if job.finished is not None:
+                await job._update_claimed({'$set': {'owner': None}})
+                return None
+
+            logfire.info(
+                'resuming userproxy sync, {remaining}/{total} left',
+                remaining=len(job.members),
+                total=job.total
+            )
+            return job
+
+        members = [
+            member.id
+            async for member in ProxyMember.find(
+                {'userproxy.token': {'$ne': None}},
+                projection_model=MemberIdProjection)
+        ]
+
+        # ? replaces any previous run, members it already synced need syncing again
+        job.fingerprint = fingerprint
+        job.members = members
+        job.total = len(members)
+        job.synced = job.skipped = job.failed = 0
+        job.ts = datetime.utcnow()
+        job.finished = None
+
+        if not await job._update_claimed({'$set': {
+            'fingerprint': job.fingerprint,
+            'members': job.members,
+            'total': job.total,
+            'synced': 0,
+            'skipped': 0,
+            'failed': 0,
+            'ts': job.ts,
+            'finished': None
+        }}):
+            return None
+
+        return job
+
+    async def _sync_member(
+        self,
+        member_id: PydanticObjectId,
+        semaphore: Semaphore,
+        limiter: InvalidRequestLimiter
+    ) -> SyncResult:
+        from src.errors import InteractionError, Unauthorized, Forbidden, NotFound
+        from src.discord.commands import sync_commands
+        from src.commands.member import _userproxy_sync
+        from src.models import MemberUpdateType
+
+        async with semaphore:
+            member = await ProxyMember.get(member_id)
+
+            # ? deleted or had its token removed since the job started
+            if (
+                member is None or
+                member.userproxy is None or
+                member.userproxy.token is None
+            ):
+                return SyncResult.SKIPPED
+
+            await limiter.wait()
+
+            try:
+                # ? a missing group or a database error fails this member, not the whole batch
+                profile = await self._profile_fingerprint(member)
+                synced = await CommandFingerprint.get(member.userproxy.bot_id)
+
+                commands_synced = await sync_commands(member.userproxy.token)
+
+                if synced is not None and synced.profile == profile:
+                    return (
+                        SyncResult.SYNCED
+                        if commands_synced else
+                        SyncResult.SKIPPED
+                    )
+
+                await _userproxy_sync(
+                    member,
+                    {MemberUpdateType.NAME, MemberUpdateType.AVATAR},
+                    ''  # ? only used for the bio, which isn't synced
+                )
+            except (Unauthorized, Forbidden, NotFound):
+                limiter.note()
+                return SyncResult.FAILED
+            except InteractionError as e:
+                # ? only rejected tokens count, not local checks like the name length
+                if isinstance(e.__context__, (Unauthorized, Forbidden, NotFound)):
+                    limiter.note()
+
+                return SyncResult.FAILED
+            except Exception as e:
+                logfire.error(
+                    'failed to sync userproxy {bot_id}',
+                    bot_id=member.userproxy.bot_id,
+                    _exc_info=e
+                )
+                return SyncResult.FAILED
+
+            await CommandFingerprint.record(
+                member.userproxy.bot_id,
+                profile=profile)
+
+            return SyncResult.SYNCED
+
+    def _report(self) -> None:
+        logfire.info(
+            'userproxy sync {done}/{total}: {synced} synced, {skipped} skipped, {failed} failed',
+            done=self.total - len(self.members),
+            total=self.total,
+            synced=self.synced,
+            skipped=self.skipped,
+            failed=self.failed
+        )
+
+    async def run(self) -> None:
+        try:
+            await self._run()
+        except CancelledError:
+            # ? shutting down, let the next startup resume it without waiting out the lease
+            await self._update_claimed({'$set': {'owner': None}})
+            raise
+
+    async def _run(self) -> None:
+        semaphore = Semaphore(self.CONCURRENCY)
+        limiter = InvalidRequestLimiter(
+            self.INVALID_REQUEST_BUDGET,
+            self.INVALID_REQUEST_WINDOW)
+
+        while self.members:
+            batch = self.members[:self.BATCH_SIZE]
+
+            results = Counter(await gather(*[
+                self._sync_member(member_id, semaphore, limiter)
+                for member_id in batch
+            ]))
+
+            self.members = self.members[len(batch):]
+            self.synced += results[SyncResult.SYNCED]
+            self.skipped += results[SyncResult.SKIPPED]
+            self.failed += results[SyncResult.FAILED]
+
+            if not await self._update_claimed({
+                '$pullAll': {'members': batch},
+                '$inc': {
+                    result.value: results[result]
+                    for result in SyncResult}
+            }):
+                logfire.warn('lost the userproxy sync lease, stopping')
+                return
+
+            self._report()
+
+        self.finished = datetime.utcnow()
+        await self._update_claimed({
+            '$set': {'finished': self.finished, 'owner': None}})
+
+    @classmethod
+    async def sync_fleet(cls, force: bool = False) -> None:
+        if (job := await cls.start(force)) is None:
+            logfire.debug('userproxy fleet unchanged, skipping sync')
+            return
+
+        await job.run()
@@ -1,10 +1,14 @@
 from __future__ import annotations
-from .models import ApplicationCommand, ApplicationCommandType, ApplicationCommandOption, ApplicationIntegrationType, InteractionContextType, Permission, InteractionCallback, ApplicationCommandScope, ApplicationCommandOptionType
+from .models import ApplicationCommand, ApplicationCommandType, ApplicationCommandOption, ApplicationIntegrationType, InteractionContextType, Permission, InteractionCallback, ApplicationCommandScope, ApplicationCommandOptionType, Interaction, ApplicationCommandInteractionData, ApplicationCommandInteractionDataOption
 from src.discord.http import Route, request, _get_bot_id
-from src.db import ProxyMember, HTTPCache
+from src.db import ProxyMember, HTTPCache, CommandFingerprint
+from typing import Any, Literal, NamedTuple, Protocol
+from src.db.invalidation import invalidator
+from orjson import dumps, OPT_SORT_KEYS
+from src.discord.types import Snowflake
 from collections.abc import Callable
 from src.models import project
-from typing import Literal
+from hashlib import sha256
 from copy import deepcopy
 import logfire
 
@@ -19,6 +23,179 @@ commands: dict[
 # ? i don't care enough to implement guild commands
 
 
+class OptionConverter(Protocol):
+    async def __call__(
+        self,
+        interaction: Interaction,
+        options: dict[str, ApplicationCommandInteractionDataOption],
+        value: Any
+    ) -> Any:
+        ...
+
+
+class CompiledCommand(NamedTuple):
+    command: ApplicationCommand
+    callback: InteractionCallback
+    converters: dict[str, OptionConverter]
+
+
+# ? string option name -> converter, registered by the logic layer
+option_converters: dict[str, OptionConverter] = {}
+# ? command path -> callback, compiled on first dispatch and cleared on registration
+_dispatch: dict[
+    ApplicationCommandScope,
+    dict[tuple[str, ...], CompiledCommand]
+] = {}
+# ? application id -> custom proxy command name, seeded whenever a userproxy is authenticated
+userproxy_command_names: dict[int, str | None] = {}
+# ? member id -> the application id its command name is cached under
+_userproxy_command_members: dict[Any, int] = {}
+
+
+def remember_userproxy_command(member: ProxyMember) -> None:
+    assert member.userproxy is not None
+
+    userproxy_command_names[member.userproxy.bot_id] = member.userproxy.command
+    _userproxy_command_members[member.id] = member.userproxy.bot_id
+
+
+def _forget_userproxy_command(member_id: Any) -> None:
+    if (application_id := _userproxy_command_members.pop(member_id, None)) is not None:
+        userproxy_command_names.pop(application_id, None)
+
+
+invalidator.register('members', _forget_userproxy_command)
+
+
+def _resolved(attribute: str) -> OptionConverter:
+    async def converter(
+        interaction: Interaction,
+        options: dict[str, ApplicationCommandInteractionDataOption],
+        value: Any
+    ) -> Any:
+        assert isinstance(interaction.data, ApplicationCommandInteractionData)
+        assert interaction.data.resolved is not None
+        assert isinstance(value, str)
+
+        resolved = getattr(interaction.data.resolved, attribute)
+        assert resolved is not None
+
+        return resolved[Snowflake(value)]
+
+    return converter
+
+
+_RESOLVED_CONVERTERS: dict[ApplicationCommandOptionType, OptionConverter] = {
+    ApplicationCommandOptionType.ATTACHMENT: _resolved('attachments'),
+    ApplicationCommandOptionType.USER: _resolved('users'),
+    ApplicationCommandOptionType.CHANNEL: _resolved('channels'),
+}
+
+
+def _compile_options(
+    options: list[ApplicationCommandOption] | None
+) -> dict[str, OptionConverter]:
+    converters: dict[str, OptionConverter] = {}
+
+    for option in options or []:
+        match option.type:
+            case ApplicationCommandOptionType.STRING if option.name in option_converters:
+                converters[option.name] = option_converters[option.name]
+            case option_type if option_type in _RESOLVED_CONVERTERS:
+                converters[option.name] = _RESOLVED_CONVERTERS[option_type]
+
+    return converters
+
+
+def _compile(
+    scope: ApplicationCommandScope
+) -> dict[tuple[str, ...], CompiledCommand]:
+    table: dict[tuple[str, ...], CompiledCommand] = {}
+
+    for command in commands[scope].values():
+        if command.callback is not None:
+            table[(command.name,)] = CompiledCommand(
+                command, command.callback, _compile_options(command.options))
+            continue
+
+        for option in command.options or []:
+            match option.type:
+                case ApplicationCommandOptionType.SUB_COMMAND if option.callback is not None:
+                    table[(command.name, option.name)] = CompiledCommand(
+                        command, option.callback, _compile_options(option.options))
+                case ApplicationCommandOptionType.SUB_COMMAND_GROUP:
+                    for subcommand in option.options or []:
+                        if subcommand.callback is None:
+                            continue
+
+                        table[(command.name, option.name, subcommand.name)] = CompiledCommand(
+                            command, subcommand.callback, _compile_options(subcommand.options))
+
+    return table
+
+
+def _command_path(
+    data: ApplicationCommandInteractionData
+) -> tuple[tuple[str, ...], list[ApplicationCommandInteractionDataOption]]:
+    path = [data.name]
+    options = data.options or []
+
+    while options and options[0].type in {
+        ApplicationCommandOptionType.SUB_COMMAND_GROUP,
+        ApplicationCommandOptionType.SUB_COMMAND
+    }:
+        path.append(options[0].name)
+        options = options[0].options or []
+
+    return tuple(path), options
+
+
+async def _userproxy_command_name(application_id: int) -> str | None:
+    if application_id in userproxy_command_names:
+        return userproxy_command_names[application_id]
+
+    member = await ProxyMember.find_one({'userproxy.bot_id': application_id})
+
+    # ? not cached, there's no member change that would evict it once the userproxy exists
+    if member is None or member.userproxy is None:
+        return None
+
+    remember_userproxy_command(member)
+
+    return member.userproxy.command
+
+
+async def resolve_command(
+    application_id: int,
+    data: ApplicationCommandInteractionData
+) -> tuple[CompiledCommand, list[ApplicationCommandInteractionDataOption]]:
+    """returns the command to dispatch to and the options to pass it"""
+    scope = (
+        ApplicationCommandScope.PRIMARY
+        if application_id == project.application_id else
+        ApplicationCommandScope.USERPROXY
+    )
+
+    if (table := _dispatch.get(scope)) is None:
+        table = _dispatch[scope] = _compile(scope)
+
+    path, options = _command_path(data)
+    compiled = table.get(path)
+
+    if (
+        compiled is None and
+        scope == ApplicationCommandScope.USERPROXY and
+        await _userproxy_command_name(application_id) == data.name
+    ):
+        compiled = table.get(('proxy', *path[1:]))
+
+    if compiled is None:
+        raise ValueError(
+            f'no command found for {' '.join(path)}')
+
+    return compiled, options
+
+
 async def _put_all_commands(
     token: str,
     override_commands: dict[str, ApplicationCommand] | None = None
@@ -46,6 +223,11 @@ async def _put_all_commands(
         ]
     )
 
+    # ? keeps the fingerprint honest when commands are replaced outside of a sync
+    await CommandFingerprint.record(
+        application_id,
+        fingerprint=_fingerprint(put_commands))
+
 
 def _patch_reason(local_command: ApplicationCommand, live_command: ApplicationCommand) -> list[str]:
     reasons = []
@@ -73,9 +255,49 @@ def _patch_reason(local_command: ApplicationCommand, live_command: ApplicationCo
     return reasons
 
 
+def _fingerprint(working_commands: dict[str, ApplicationCommand]) -> str:
+    return sha256(dumps(
+        [
+            working_commands[name]._as_registration_dict()
+            for name in sorted(working_commands)
+        ],
+        option=OPT_SORT_KEYS
+    )).hexdigest()
+
+
+def _working_commands(
+    scope: ApplicationCommandScope,
+    member: ProxyMember | None = None
+) -> dict[str, ApplicationCommand]:
+    working_commands = commands[scope]
+
+    if scope == ApplicationCommandScope.USERPROXY:
+        working_commands = deepcopy(working_commands)
+        # ? userproxy edit is deprecated, will be removed from codebase in the future
+        working_commands.pop('edit', None)
+
+    # ? inject custom userproxy 'proxy' command name
+    if scope == ApplicationCommandScope.USERPROXY and 'proxy' in working_commands:
+        # ? move the deepcopy to here once the edit command is removed
+        # working_commands = deepcopy(working_commands)
+
+        if member and member.userproxy and member.userproxy.command:
+            command = working_commands.pop('proxy')
+            command.name = member.userproxy.command
+            working_commands[command.name] = command
+
+    return working_commands
+
+
+def userproxy_commands_fingerprint() -> str:
+    """fingerprint of the userproxy command schema, ignoring per-member command names"""
+    return _fingerprint(_working_commands(ApplicationCommandScope.USERPROXY))
+
+
 async def _sync_commands(
-    token: str | None = None
-) -> None:
+    token: str | None = None,
+    force: bool = False
+) -> bool:
     global commands
     application_id = _get_bot_id(token or project.bot_token)
 
@@ -103,6 +325,33 @@ async def _sync_commands(
     if token != project.bot_token:
         member = await ProxyMember.find_one({'userproxy.bot_id': application_id})
 
+    working_commands = _working_commands(scope, member)
+
+    # ? skips the discord round trips entirely when nothing changed since the last sync
+    fingerprint = _fingerprint(working_commands)
+
+    if (
+        not force and
+        (synced := await CommandFingerprint.get(application_id)) is not None and
+        synced.fingerprint == fingerprint
+    ):
+        logfire.debug('commands unchanged, skipping sync')
+        return False
+
+    await _sync_live_commands(application_id, token, working_commands)
+
+    await CommandFingerprint.record(
+        application_id,
+        fingerprint=fingerprint)
+
+    return True
+
+
+async def _sync_live_commands(
+    application_id: int,
+    token: str,
+    working_commands: dict[str, ApplicationCommand]
+) -> None:
     live_commands: dict[str, ApplicationCommand] = {
         command['name']: ApplicationCommand(**command)
         for command in await request(
@@ -115,23 +364,6 @@ async def _sync_commands(
         )
     }
 
-    working_commands = commands[scope]
-
-    if scope == ApplicationCommandScope.USERPROXY:
-        working_commands = deepcopy(working_commands)
-        # ? userproxy edit is deprecated, will be removed from codebase in the future
-        working_commands.pop('edit', None)
-
-    # ? inject custom userproxy 'proxy' command name
-    if scope == ApplicationCommandScope.USERPROXY and 'proxy' in working_commands:
-        # ? move the deepcopy to here once the edit command is removed
-        # working_commands = deepcopy(working_commands)
-
-        if member and member.userproxy and member.userproxy.command:
-            command = working_commands.pop('proxy')
-            command.name = member.userproxy.command
-            working_commands[command.name] = command
-
     if working_commands != live_commands:
         await HTTPCache.invalidate(f'/applications/{application_id}/commands')
 
@@ -221,15 +453,16 @@ async def _sync_commands(
 
 
 async def sync_commands(
-    token: str | None = None
-) -> None:
+    token: str | None = None,
+    force: bool = False
+) -> bool:
+    """returns whether anything was synced, False when the fingerprint was unchanged"""
     application_id = _get_bot_id(token or project.bot_token)
     if project.logfire_token:
         with logfire.span('sync_commands with {application_id}', application_id=application_id):
-            await _sync_commands(token)
-        return
+            return await _sync_commands(token, force)
 
-    await _sync_commands(token)
+    return await _sync_commands(token, force)
 
 
 def _base_command(
@@ -250,6 +483,7 @@ def _base_command(
                     **kwargs
                 )
             )
+            _dispatch.clear()
 
             return parent
 
@@ -261,6 +495,7 @@ def _base_command(
         )
 
         commands[scope][name] = command
+        _dispatch.clear()
 
         return command
 
@@ -313,6 +548,7 @@ def SlashCommandGroup(
     )
 
     commands[scope][name] = command
+    _dispatch.clear()
 
     return command
 
@@ -24,11 +24,14 @@
 from __future__ import annotations
 from src.errors import HTTPException, Forbidden, NotFound, ServerError, Unauthorized, InteractionError
 from aiohttp import __version__ as aiohttp_version, FormData, ClientResponse
-from asyncio import sleep, Lock, Event, get_event_loop, create_task
+from src.core.supervisor import supervisor, TaskClass
+from asyncio import sleep, Lock, Event, get_event_loop
 from typing import Any, Iterable, Sequence
+from collections.abc import AsyncGenerator
 from datetime import datetime, timezone
 from weakref import WeakValueDictionary
 from base64 import b64encode, b64decode
+from .traffic import traffic, RecordedResponse
 from src.db.httpcache import HTTPCache
 from src.core.session import session
 from re import match, IGNORECASE
@@ -36,7 +39,7 @@ from src.version import VERSION
 from orjson import dumps, loads
 from types import TracebackType
 from urllib.parse import quote
-from src.models import project
+from src.models import project, HTTPTrafficMode
 from io import BufferedIOBase
 from sys import version_info
 
@@ -121,7 +124,7 @@ class MaybeUnlock:
             self.lock.release()
 
 
-async def json_or_text(response: ClientResponse) -> dict[str, Any] | str:
+async def json_or_text(response: ClientResponse | RecordedResponse) -> dict[str, Any] | str:
     text = await response.text(encoding='utf-8')
     try:
         if response.headers['content-type'] == 'application/json':
@@ -296,7 +299,7 @@ async def request(
     if global_limit.is_set():
         await global_limit.wait()
 
-    response: ClientResponse | None = None
+    response: ClientResponse | RecordedResponse | None = None
     resp_data: dict[str, Any] | str | None = None
     await lock.acquire()
     with MaybeUnlock(lock) as maybe_lock:
@@ -312,7 +315,7 @@ async def request(
                 data = form_data
 
             try:
-                async with session.request(
+                async with traffic.request(
                     route.method,
                     route.url,
                     data=data,
@@ -340,7 +343,7 @@ async def request(
                         )
 
                     if response.status < 500 and response.status != 429:
-                        create_task(cache_response(
+                        supervisor.spawn(TaskClass.CACHE, cache_response(
                             route, response.status, resp_data))
 
                     if 300 > response.status >= 200:
@@ -395,7 +398,7 @@ async def request(
 
 
 async def get_from_cdn(url: str) -> bytes:
-    async with session.get(url) as resp:
+    async with traffic.request('GET', url) as resp:
         match resp.status:
             case 200:
                 return await resp.read()
@@ -405,3 +408,27 @@ async def get_from_cdn(url: str) -> bytes:
                 raise Forbidden('cannot retrieve asset')
             case _:
                 raise HTTPException('failed to get asset')
+
+
+async def stream_from_cdn(
+    url: str,
+    chunk_size: int = 65536
+) -> AsyncGenerator[bytes, None]:
+    async with traffic.request('GET', url) as resp:
+        match resp.status:
+            case 200:
+                pass
+            case 404:
+                raise NotFound('asset not found')
+            case 403:
+                raise Forbidden('cannot retrieve asset')
+            case _:
+                raise HTTPException('failed to get asset')
+
+        # ? recorded traffic needs the whole body, replayed traffic only has the whole body
+        if isinstance(resp, RecordedResponse) or traffic.mode == HTTPTrafficMode.RECORD:
+            yield await resp.read()
+            return
+
+        async for chunk in resp.content.iter_chunked(chunk_size):
+            yield chunk
@@ -5,17 +5,35 @@ from asyncio import gather
 
 
 __listeners: dict[ListenerType, list[Callable[..., Awaitable[None]]]] = {}
+__prefilters: dict[Callable[..., Awaitable[None]],
+                   Callable[[dict], Awaitable[bool]]] = {}
 
 
-def listen(event_name: ListenerType):
+def listen(
+    event_name: ListenerType,
+    prefilter: Callable[[dict], Awaitable[bool]] | None = None
+):
     def decorator(func: Callable[..., Awaitable[None]]):
         if event_name not in __listeners:
             __listeners[event_name] = []
         __listeners[event_name].append(func)
+        if prefilter is not None:
+            __prefilters[func] = prefilter
         return func
     return decorator
 
 
+async def should_emit(event_name: ListenerType, data: dict) -> bool:
+    # ? checked against the raw event data, before any models are built
+    for listener in __listeners.get(event_name, []):
+        prefilter = __prefilters.get(listener)
+
+        if prefilter is None or await prefilter(data):
+            return True
+
+    return False
+
+
 async def emit(event_name: ListenerType, *args, **kwargs):
     if event_name in __listeners:
         for exception in await gather(*[
@@ -4,6 +4,7 @@ from .attachment import *
 from .avatar_decoration import *
 from .channel import *
 from .component import *
+from .context import *
 from .embed import *
 from .emoji import *
 from .enums import *
@@ -71,6 +72,8 @@ __all__ = (
     'ComponentType',
     'TextInput',
     'TextInputStyle',
+    # context.py
+    'PopulateContext',
     # embed.py
     'Embed',
     'EmbedAuthor',
@@ -1,29 +1,131 @@
+from __future__ import annotations
 from pydantic_core.core_schema import CoreSchema, any_schema
 from pydantic.json_schema import JsonSchemaValue
-from pydantic import BaseModel
-from typing import Self
+from typing import Any, Self, TYPE_CHECKING, Union, get_args, get_origin
+from pydantic import BaseModel, PrivateAttr, TypeAdapter
+from types import NoneType, UnionType
+from asyncio import gather
+
+if TYPE_CHECKING:
+    from .context import PopulateContext
+
+
+# ? per model, the list[Model] fields trusted payloads defer until first access
+_deferrable_fields: dict[type, dict[str, TypeAdapter]] = {}
+
+
+def _is_model_list(annotation: Any) -> bool:
+    if get_origin(annotation) in {Union, UnionType}:
+        return all(
+            _is_model_list(arg)
+            for arg in get_args(annotation)
+            if arg is not NoneType
+        )
+
+    return (
+        get_origin(annotation) is list and
+        isinstance(args := get_args(annotation)[0], type) and
+        issubclass(args, BaseModel)
+    )
 
 
 class RawBaseModel(BaseModel):
+    # ? raw payloads of the fields from_trusted hasn't validated yet
+    _deferred: dict[str, Any] = PrivateAttr(default_factory=dict)
+
     def __init__(self, **data):
         super().__init__(**data)
-        self.__raw_data = data.copy()
+        # ? kwargs are already a fresh dict, only copied if someone reads _raw
+        self.__raw_data = data
 
     @property
     def _raw(self) -> dict:
-        return self.__raw_data
+        return self.__raw_data.copy()
+
+    @classmethod
+    def _deferrable(cls) -> dict[str, TypeAdapter]:
+        if cls not in _deferrable_fields:
+            _deferrable_fields[cls] = {
+                name: TypeAdapter(field.annotation)
+                for name, field in cls.model_fields.items()
+                if field.alias is None and _is_model_list(field.annotation)
+            }
+
+        return _deferrable_fields[cls]
+
+    @classmethod
+    def from_trusted(cls, data: dict) -> Self:
+        # ? for payloads straight from discord or the http cache, nested model
+        # ? lists (guild roles, emojis, etc.) are only validated when accessed
+        deferred = {
+            name: data[name]
+            for name in cls._deferrable()
+            if data.get(name)
+        }
+
+        self = cls(**{
+            **data,
+            **{name: [] for name in deferred}
+        })
+
+        for name in deferred:
+            del self.__dict__[name]
 
-    async def populate(self) -> None:
-        for field in self.model_fields_set:
-            value = getattr(self, field, None)
-            if value and issubclass(value.__class__, RawBaseModel):
-                await value.populate()
+        self._deferred = deferred
+        self.__raw_data = data
+
+        return self
+
+    def __getattr__(self, name: str) -> Any:
+        # ? read directly, attribute access would recurse back into __getattr__
+        deferred = (self.__pydantic_private__ or {}).get('_deferred')
+
+        if not deferred or name not in deferred:
+            return super().__getattr__(name)  # type: ignore[misc]
+
+        value = self._deferrable()[name].validate_python(deferred.pop(name))
+        self.__dict__[name] = value
+
+        return value
+
+    def _materialize(self) -> None:
+        for name in list(self._deferred):
+            getattr(self, name)
+
+    def model_dump(self, **kwargs) -> dict[str, Any]:
+        self._materialize()
+        return super().model_dump(**kwargs)
+
+    def model_dump_json(self, **kwargs) -> str:
+        self._materialize()
+        return super().model_dump_json(**kwargs)
+
+    def __eq__(self, other: object) -> bool:
+        self._materialize()
+
+        if isinstance(other, RawBaseModel):
+            other._materialize()
+
+        return super().__eq__(other)
+
+    async def populate(self, context: PopulateContext | None = None) -> None:
+        # ? deferred fields are skipped, they haven't been built yet
+        await gather(*[
+            value.populate(context)
+            for field in self.model_fields_set
+            if field in self.__dict__
+            if isinstance(value := self.__dict__[field], RawBaseModel)
+        ])
 
     @classmethod
-    async def validate_and_populate(cls, data: dict) -> Self:
+    async def validate_and_populate(
+        cls,
+        data: dict,
+        context: PopulateContext | None = None
+    ) -> Self:
         self = cls(**data)
 
-        await self.populate()
+        await self.populate(context)
 
         return self
 
@@ -90,8 +90,8 @@ class Channel(RawBaseModel):
 
     @classmethod
     async def fetch(cls, channel_id: Snowflake | int) -> Channel:
-        return cls(
-            **await request(
+        return cls.from_trusted(
+            await request(
                 Route(
                     'GET',
                     '/channels/{channel_id}',
@@ -0,0 +1,46 @@
+from __future__ import annotations
+from collections.abc import Awaitable, Callable
+from src.discord.types import Snowflake
+from asyncio import Future, ensure_future
+from typing import Any
+from .channel import Channel
+from .member import Member
+from .guild import Guild
+
+
+class PopulateContext:
+    # ? shared by every model populated for a single event, so the same
+    # ? channel, guild or member is only ever fetched once
+    def __init__(self) -> None:
+        self._fetches: dict[tuple, Future[Any]] = {}
+
+    def _fetch(
+        self,
+        key: tuple,
+        fetch: Callable[[], Awaitable[Any]]
+    ) -> Future[Any]:
+        future = self._fetches.get(key)
+
+        if future is None:
+            future = self._fetches[key] = ensure_future(fetch())
+
+        return future
+
+    async def channel(self, channel_id: Snowflake | int) -> Channel:
+        return await self._fetch(
+            ('channel', int(channel_id)),
+            lambda: Channel.fetch(channel_id))
+
+    async def guild(self, guild_id: Snowflake | int) -> Guild:
+        return await self._fetch(
+            ('guild', int(guild_id)),
+            lambda: Guild.fetch(guild_id))
+
+    async def member(
+        self,
+        guild_id: Snowflake | int,
+        user_id: Snowflake | int
+    ) -> Member:
+        return await self._fetch(
+            ('member', int(guild_id), int(user_id)),
+            lambda: Member.fetch(guild_id, user_id))
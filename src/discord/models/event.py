@@ -1,7 +1,9 @@
 from __future__ import annotations
 from .enums import GatewayOpCode, GatewayEventName, ReactionType
 from src.discord.types import Snowflake
+from .context import PopulateContext
 from .base import RawBaseModel
+from asyncio import gather
 from .message import Message
 from pydantic import Field
 from .member import Member
@@ -32,14 +34,22 @@ class MessageCreateEvent(Message, RawBaseModel):
     guild_id: Snowflake | None = None
     member: Member | None = None
 
-    async def populate(self) -> None:
-        await super().populate()
-
-        if self.guild_id is not None and self.author is not None and self.webhook_id is None:
-            self.member = await Member.fetch(
-                self.guild_id,
-                self.author.id
-            )
+    async def _populate(
+        self,
+        context: PopulateContext,
+        guild_id: Snowflake | None = None
+    ) -> None:
+        async def populate_member() -> None:
+            if self.guild_id is not None and self.author is not None and self.webhook_id is None:
+                self.member = await context.member(
+                    self.guild_id,
+                    self.author.id
+                )
+
+        await gather(
+            super()._populate(context, self.guild_id),
+            populate_member()
+        )
 
 
 class MessageUpdateEvent(MessageCreateEvent):
@@ -111,8 +111,8 @@ class Guild(RawBaseModel):
 
     @classmethod
     async def fetch(cls, guild_id: Snowflake | int) -> Guild:
-        return cls(
-            **await request(
+        return cls.from_trusted(
+            await request(
                 Route(
                     'GET',
                     '/guilds/{guild_id}',
@@ -128,7 +128,7 @@ class Guild(RawBaseModel):
         ignore_cache: bool = False
     ) -> list[Guild]:
         return [
-            cls(**guild)
+            cls.from_trusted(guild)
             for guild in
             await request(
                 Route(
@@ -8,7 +8,9 @@ from .component import ActionRow
 from .resolved import Resolved
 from src.models import project
 from src.db import ProxyMember
+from .context import PopulateContext
 from .base import RawBaseModel
+from asyncio import gather
 from datetime import datetime
 from .message import Message
 from .channel import Channel
@@ -132,35 +134,45 @@ class Interaction(RawBaseModel):
             self.response.send_message
         )
 
-    async def populate(self) -> None:
+    async def populate(self, context: PopulateContext | None = None) -> None:
         # ? interactions return partials, make sure to get the full objects
-        await super().populate()
+        context = context or PopulateContext()
         self.response = InteractionResponse(self)
         self.followup = InteractionFollowup(self)
 
-        if self.channel_id is not None:
-            try:
-                self.channel = await Channel.fetch(self.channel_id)
-            except (Forbidden, NotFound):
-                pass
-
-        if self.guild_id is not None:
-            try:
-                self.guild = await Guild.fetch(self.guild_id)
-            except (Forbidden, NotFound):
-                pass
-
-        if self.member is not None and self.guild is not None:
-            try:
-                self.member = await Member.fetch(self.guild.id, self.author_id)
-            except (Forbidden, NotFound):
-                pass
-
-        if self.user is not None:
-            try:
-                self.user = await User.fetch(self.author_id)
-            except (Forbidden, NotFound):
-                pass
+        async def populate_channel() -> None:
+            if self.channel_id is not None:
+                try:
+                    self.channel = await context.channel(self.channel_id)
+                except (Forbidden, NotFound):
+                    pass
+
+        async def populate_guild() -> None:
+            if self.guild_id is not None:
+                try:
+                    self.guild = await context.guild(self.guild_id)
+                except (Forbidden, NotFound):
+                    pass
+
+            if self.member is not None and self.guild is not None:
+                try:
+                    self.member = await context.member(self.guild.id, self.author_id)
+                except (Forbidden, NotFound):
+                    pass
+
+        async def populate_user() -> None:
+            if self.user is not None:
+                try:
+                    self.user = await User.fetch(self.author_id)
+                except (Forbidden, NotFound):
+                    pass
+
+        await gather(
+            super().populate(context),
+            populate_channel(),
+            populate_guild(),
+            populate_user()
+        )
 
         if self.application_id != project.application_id:
             self.proxy_member = await ProxyMember.find_one(
@@ -35,8 +35,8 @@ class Member(RawBaseModel):
 
     @classmethod
     async def fetch(cls, guild_id: Snowflake | int, user_id: Snowflake | int) -> Member:
-        return cls(
-            **await request(
+        return cls.from_trusted(
+            await request(
                 Route(
                     'GET',
                     '/guilds/{guild_id}/members/{user_id}',
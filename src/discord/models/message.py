@@ -1,7 +1,7 @@
 from __future__ import annotations
 from .enums import MessageType, MessageReferenceType, MessageFlag, AllowedMentionType, InteractionType, ApplicationIntegrationType
 from src.discord.http import Route, request, File
-from asyncio import get_event_loop, create_task
+from src.core.supervisor import supervisor, TaskClass
 from .channel import ChannelMention, Channel
 from typing import ForwardRef, TYPE_CHECKING
 from .sticker import Sticker, StickerItem
@@ -15,7 +15,9 @@ from .reaction import Reaction
 from src.models import project
 from .base import RawBaseModel
 from datetime import datetime
-from pydantic import Field
+from asyncio import Future, ensure_future, gather
+from pydantic import Field, PrivateAttr
+from .context import PopulateContext
 from .guild import Guild
 from .embed import Embed
 from orjson import dumps
@@ -110,6 +112,7 @@ class Message(RawBaseModel):
     # ? library only, not sent by discord
     channel: Channel | None = None
     guild: Guild | None = None
+    _populating: Future[None] | None = PrivateAttr(None)
 
     @property
     def jump_url(self) -> str:
@@ -118,20 +121,40 @@ class Message(RawBaseModel):
 
         return f'https://discord.com/channels/{self.guild.id}/{self.channel_id}/{self.id}'
 
-    async def populate(self) -> None:
-        await super().populate()
-        if self.channel_id is None:
-            return
+    async def populate(self, context: PopulateContext | None = None) -> None:
+        # ? listeners populate lazily and may race each other, only populate once
+        if self._populating is None:
+            self._populating = ensure_future(
+                self._populate(context or PopulateContext()))
 
-        try:
-            self.channel = await Channel.fetch(self.channel_id)
-        except Forbidden:
-            return
+        await self._populating
 
-        if self.channel.guild_id is None:
-            return
+    async def _populate(
+        self,
+        context: PopulateContext,
+        guild_id: Snowflake | None = None
+    ) -> None:
+        async def populate_channel() -> None:
+            try:
+                self.channel = await context.channel(self.channel_id)
+            except Forbidden:
+                pass
+
+        async def populate_guild(guild_id: Snowflake) -> None:
+            self.guild = await context.guild(guild_id)
+
+        await gather(
+            super().populate(context),
+            populate_channel(),
+            *([populate_guild(guild_id)] if guild_id is not None else [])
+        )
 
-        self.guild = await Guild.fetch(self.channel.guild_id)
+        if (
+            guild_id is None and
+            self.channel is not None and
+            self.channel.guild_id is not None
+        ):
+            await populate_guild(self.channel.guild_id)
 
     async def delete(
         self,
@@ -265,10 +288,10 @@ class Message(RawBaseModel):
         )
 
         if delete_after:
-            get_event_loop().call_later(
+            supervisor.call_later(
                 delete_after,
-                create_task,
-                self.delete()
+                TaskClass.MESSAGE_CLEANUP,
+                self.delete
             )
 
         return self
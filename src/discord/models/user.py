@@ -66,8 +66,8 @@ class User(RawBaseModel):
         user_id: Snowflake | int | Literal['@me'],
         token: str | None = project.bot_token
     ) -> User:
-        return cls(
-            **await request(
+        return cls.from_trusted(
+            await request(
                 Route(
                     'GET',
                     '/users/{user_id}',
@@ -0,0 +1,132 @@
+from __future__ import annotations
+from multidict import CIMultiDict, CIMultiDictProxy
+from contextlib import asynccontextmanager
+from src.models import project, HTTPTrafficMode
+from collections.abc import AsyncIterator
+from base64 import b64encode, b64decode
+from src.core.session import session
+from src.errors import HTTPException
+from aiohttp import ClientResponse
+from time import perf_counter, time
+from orjson import dumps, loads
+from typing import BinaryIO
+from pathlib import Path
+
+
+class RecordedResponse:
+    def __init__(self, entry: dict) -> None:
+        self.method: str = entry['method']
+        self.url: str = entry['url']
+        self.status: int = entry['status']
+        self.headers = CIMultiDictProxy(CIMultiDict(entry['headers']))
+        self.elapsed: float = entry['elapsed']
+        self._body = b64decode(entry['body'])
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def text(self, encoding: str = 'utf-8') -> str:
+        return self._body.decode(encoding)
+
+
+class HTTPTraffic:
+    def __init__(self, mode: HTTPTrafficMode, path: str) -> None:
+        self.mode = mode
+        self.path = Path(path)
+        self._file: BinaryIO | None = None
+        self._recorded: dict[str, list[RecordedResponse]] | None = None
+        self._cursors: dict[str, int] = {}
+
+    @staticmethod
+    def key(method: str, url: str) -> str:
+        return f'{method} {url}'
+
+    def _write(self, entry: dict) -> None:
+        if self._file is None:
+            self._file = self.path.open('ab')
+
+        self._file.write(dumps(entry) + b'\n')
+        self._file.flush()
+
+    async def _record(
+        self,
+        method: str,
+        url: str,
+        response: ClientResponse,
+        started: float
+    ) -> None:
+        self._write({
+            'ts': time(),
+            'method': method,
+            'url': url,
+            'status': response.status,
+            'headers': list(response.headers.items()),
+            'body': b64encode(await response.read()).decode(),
+            'elapsed': perf_counter() - started
+        })
+
+    def _load(self) -> dict[str, list[RecordedResponse]]:
+        recorded: dict[str, list[RecordedResponse]] = {}
+
+        if not self.path.exists():
+            return recorded
+
+        with self.path.open('rb') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+
+                response = RecordedResponse(loads(line))
+                recorded.setdefault(
+                    self.key(response.method, response.url), []
+                ).append(response)
+
+        return recorded
+
+    def _replay(self, method: str, url: str) -> RecordedResponse:
+        if self._recorded is None:
+            self._recorded = self._load()
+
+        key = self.key(method, url)
+        responses = self._recorded.get(key)
+
+        if not responses:
+            raise HTTPException(f'no recorded response for {key}')
+
+        # ? responses are served in recorded order, the last one repeats once exhausted
+        index = self._cursors.get(key, 0)
+        self._cursors[key] = index + 1
+
+        return responses[min(index, len(responses) - 1)]
+
+    @asynccontextmanager
+    async def request(
+        self,
+        method: str,
+        url: str,
+        **kwargs
+    ) -> AsyncIterator[ClientResponse | RecordedResponse]:
+        match self.mode:
+            case HTTPTrafficMode.REPLAY:
+                yield self._replay(method, url)
+            case HTTPTrafficMode.RECORD:
+                started = perf_counter()
+                async with session.request(method, url, **kwargs) as response:
+                    try:
+                        yield response
+                    finally:
+                        await self._record(method, url, response, started)
+            case _:
+                async with session.request(method, url, **kwargs) as response:
+                    yield response
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+traffic = HTTPTraffic(
+    project.http_traffic.mode,
+    project.http_traffic.file
+)
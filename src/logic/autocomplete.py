@@ -1,10 +1,25 @@
 from src.discord import Interaction, ApplicationCommandInteractionData, ApplicationCommandOptionType, ApplicationCommandInteractionDataOption, ApplicationCommandOptionChoice
-from typing import NamedTuple, Protocol
-from thefuzz.utils import full_process
-from src.db import ProxyMember, Group
+from src.db.projections import MemberProxyTagsProjection
+from rapidfuzz.utils import default_process
 from beanie import PydanticObjectId
+from rapidfuzz import process, fuzz
 from bson.errors import InvalidId
-from thefuzz import process
+from .search import search_indexes
+from asyncio import Task, create_task, shield, wait_for
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from time import time, perf_counter
+from src.db import ProxyMember
+from typing import Protocol
+import logfire
+
+
+# ? discord drops autocomplete responses that arrive more than 3 seconds after the interaction
+AUTOCOMPLETE_DEADLINE = 3.0
+# ? leaves room for the response to actually reach discord
+AUTOCOMPLETE_MARGIN = 0.5
+AUTOCOMPLETE_CACHE_ENTRIES = 8192
+AUTOCOMPLETE_CACHE_MAX_AGE = 300
 
 
 class AutocompleteCallback(Protocol):
@@ -12,13 +27,167 @@ class AutocompleteCallback(Protocol):
         ...
 
 
-class ProcessedMember(NamedTuple):
-    name: str
-    score: int
-    member: ProxyMember
-    group: Group
+@dataclass
+class AutocompleteStats:
+    calls: int = 0
+    fresh: int = 0
+    stale: int = 0
+    deadline_misses: int = 0
+    failures: int = 0
+    total_latency: float = 0.0
+    max_latency: float = 0.0
+    completed: int = 0
+
+    @property
+    def average_latency(self) -> float:
+        return self.total_latency / self.completed if self.completed else 0.0
+
+
+ResultKey = tuple[str, int, tuple[tuple[str, str], ...]]
+LatestKey = tuple[str, int]
+
+
+class AutocompleteEngine:
+    # ? callbacks race the interaction deadline, when they lose the last results for the
+    # ? same input (or failing that, the user's last results) are sent instead and the
+    # ? callback keeps running in the background to refresh the cache
+    def __init__(self, max_entries: int, max_age: float) -> None:
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.stats: defaultdict[str, AutocompleteStats] = defaultdict(AutocompleteStats)
+        self._results: OrderedDict[ResultKey, tuple[float, list[ApplicationCommandOptionChoice]]] = OrderedDict()
+        self._latest: OrderedDict[LatestKey, tuple[float, list[ApplicationCommandOptionChoice]]] = OrderedDict()
+        self._refreshing: dict[ResultKey, Task[list[ApplicationCommandOptionChoice]]] = {}
+        self._latency = logfire.metric_histogram(
+            'autocomplete_latency', unit='s',
+            description='time taken by autocomplete callbacks')
+        self._deadline_misses = logfire.metric_counter(
+            'autocomplete_deadline_misses', unit='1',
+            description='autocomplete callbacks that did not finish before the deadline')
+
+    @staticmethod
+    def _remaining(interaction: Interaction) -> float:
+        created_at = ((interaction.id >> 22) + 1420070400000) / 1000
+        budget = AUTOCOMPLETE_DEADLINE - AUTOCOMPLETE_MARGIN
+
+        # ? clamped in case the local clock disagrees with discord's
+        return min(max(created_at + budget - time(), 0.0), budget)
+
+    def _store(
+        self,
+        cache: OrderedDict,
+        key: ResultKey | LatestKey,
+        choices: list[ApplicationCommandOptionChoice]
+    ) -> None:
+        cache[key] = (perf_counter(), choices)
+        cache.move_to_end(key)
+
+        while len(cache) > self.max_entries:
+            cache.popitem(last=False)
+
+    def _fresh(
+        self,
+        entry: tuple[float, list[ApplicationCommandOptionChoice]] | None
+    ) -> list[ApplicationCommandOptionChoice] | None:
+        if entry is None:
+            return None
+
+        stored_at, choices = entry
+
+        return choices if perf_counter() - stored_at < self.max_age else None
+
+    def _cached(
+        self,
+        key: ResultKey,
+        latest_key: LatestKey
+    ) -> list[ApplicationCommandOptionChoice] | None:
+        if (choices := self._fresh(self._results.get(key))) is not None:
+            return choices
+
+        return self._fresh(self._latest.get(latest_key))
+
+    async def _refresh(
+        self,
+        name: str,
+        key: ResultKey,
+        latest_key: LatestKey,
+        callback: AutocompleteCallback,
+        interaction: Interaction,
+        options: dict[str, ApplicationCommandInteractionDataOption]
+    ) -> list[ApplicationCommandOptionChoice]:
+        stats = self.stats[name]
+        started = perf_counter()
+
+        try:
+            choices = await callback(interaction, options)
+        except Exception:
+            stats.failures += 1
+            raise
+        finally:
+            latency = perf_counter() - started
+            stats.completed += 1
+            stats.total_latency += latency
+            stats.max_latency = max(stats.max_latency, latency)
+            self._latency.record(latency, {'callback': name})
+
+        self._store(self._results, key, choices)
+        self._store(self._latest, latest_key, choices)
+
+        return choices
+
+    def _refreshed(self, key: ResultKey, task: Task) -> None:
+        self._refreshing.pop(key, None)
+
+        if not task.cancelled() and (e := task.exception()) is not None:
+            logfire.error('autocomplete refresh failed', _exc_info=e)
+
+    async def complete(
+        self,
+        name: str,
+        callback: AutocompleteCallback,
+        interaction: Interaction,
+        options: dict[str, ApplicationCommandInteractionDataOption]
+    ) -> list[ApplicationCommandOptionChoice]:
+        stats = self.stats[name]
+        stats.calls += 1
+
+        key: ResultKey = (
+            name,
+            interaction.author_id,
+            tuple(sorted(
+                (option_name, str(option.value))
+                for option_name, option in options.items()))
+        )
+        latest_key: LatestKey = (name, interaction.author_id)
+
+        # ? keystrokes that repeat an in-flight input wait on the same refresh
+        task = self._refreshing.get(key)
+
+        if task is None:
+            task = self._refreshing[key] = create_task(self._refresh(
+                name, key, latest_key, callback, interaction, options))
+            task.add_done_callback(lambda task: self._refreshed(key, task))
+
+        try:
+            choices = await wait_for(shield(task), self._remaining(interaction))
+        except TimeoutError:
+            stats.deadline_misses += 1
+            self._deadline_misses.add(1, {'callback': name})
+
+            if (cached := self._cached(key, latest_key)) is None:
+                return []
+
+            stats.stale += 1
+            return cached
+
+        stats.fresh += 1
+        return choices
 
 
+autocomplete_engine = AutocompleteEngine(
+    AUTOCOMPLETE_CACHE_ENTRIES,
+    AUTOCOMPLETE_CACHE_MAX_AGE
+)
 __callbacks: dict[str, AutocompleteCallback] = {}
 
 
@@ -57,7 +226,9 @@ async def on_autocomplete(interaction: Interaction) -> None:
 
     choices = []
     if callback is not None:
-        choices = await callback(
+        choices = await autocomplete_engine.complete(
+            focused_option.name,
+            callback,
             interaction,
             {
                 option.name: option
@@ -79,70 +250,25 @@ async def autocomplete_member(
     if options['userproxy' if userproxies_only else 'member'] is None:
         return []
 
-    groups = {
-        group.name: group
-        for group in
-        await Group.find({'accounts': interaction.author_id}).to_list()
-    }
-
     selected_group = options.get('group')
 
-    members: list[tuple[ProxyMember, Group]] = []
-
-    for group in groups.values():
-        if selected_group is not None and group.name != selected_group.value:
-            continue
-
-        members.extend((
-            (member, group)
-            for member in
-            await group.get_members()
-            if not userproxies_only or member.userproxy is not None
-        ))
-
-    def return_members(
-        members: list[tuple[ProxyMember, Group]]
-    ) -> list[ApplicationCommandOptionChoice]:
-        return [
-            ApplicationCommandOptionChoice(
-                name=f'[{group.name}] {member.name}',
-                value=str(member.id)
-            )
-            for member, group in members[:25]
-        ]
+    index = await search_indexes.get(interaction.author_id)
 
-    if not members:
-        return return_members(members)
-
-    typed_value = str(
-        options['userproxy' if userproxies_only else 'member'].value)
-
-    if not full_process(typed_value):
-        return return_members(members)
-
-    return return_members(
-        [
-            (member, group)
-            for _, score, member, group in [
-                ProcessedMember(
-                    processed[0],
-                    processed[1],
-                    processed[2][0],
-                    processed[2][1]
-                )
-                for processed in
-                process.extract(
-                    typed_value,
-                    {
-                        (member, group): member.name
-                        for member, group in members
-                    },
-                    limit=10
-                )
-            ]
-            if score > 60
-        ]
-    )
+    return [
+        ApplicationCommandOptionChoice(
+            name=f'[{member.group_name}] {member.name}',
+            value=str(member.id)
+        )
+        for member in
+        index.search_members(
+            str(options['userproxy' if userproxies_only else 'member'].value),
+            group_name=(
+                str(selected_group.value)
+                if selected_group is not None else
+                None),
+            userproxies_only=userproxies_only
+        )
+    ]
 
 
 @autocomplete('group')
@@ -150,32 +276,14 @@ async def autocomplete_group(
     interaction: Interaction,
     options: dict[str, ApplicationCommandInteractionDataOption]
 ) -> list[ApplicationCommandOptionChoice]:
-    groups = {
-        group: group.name
-        for group in
-        await Group.find({'accounts': interaction.author_id}).to_list()
-    }
-
-    typed_value = str(options['group'].value)
-
-    if not full_process(typed_value):
-        return [
-            ApplicationCommandOptionChoice(
-                name=group_name,
-                value=str(group.id))
-            for group, group_name in groups.items()
-        ]
+    index = await search_indexes.get(interaction.author_id)
 
     return [
         ApplicationCommandOptionChoice(
-            name=processed[0],
-            value=str(processed[2].id))
-        for processed in
-        process.extract(
-            typed_value,
-            groups,
-            limit=10
-        )
+            name=group.name,
+            value=str(group.id))
+        for group in
+        index.search_groups(str(options['group'].value))
     ]
 
 
@@ -207,24 +315,27 @@ async def autocomplete_proxy_tag(
     except InvalidId:
         return []
 
-    member = await ProxyMember.get(member_id)
+    member = await ProxyMember.find_one(
+        {'_id': member_id},
+        projection_model=MemberProxyTagsProjection
+    )
 
     if member is None:
         return []
 
-    proxy_tags = {
-        str(index): f'{tag.prefix}text{tag.suffix}'
-        for index, tag in enumerate(member.proxy_tags)
-    }
+    proxy_tags = [
+        f'{tag.prefix}text{tag.suffix}'
+        for tag in member.proxy_tags
+    ]
 
-    typed_value = str(options['proxy_tag'].value)
+    typed_value = default_process(str(options['proxy_tag'].value))
 
-    if not full_process(typed_value):
+    if not typed_value:
         return [
             ApplicationCommandOptionChoice(
                 name=tag,
-                value=index)
-            for index, tag in proxy_tags.items()
+                value=str(index))
+            for index, tag in enumerate(proxy_tags)
         ]
 
     return [
@@ -235,6 +346,8 @@ async def autocomplete_proxy_tag(
         process.extract(
             typed_value,
             proxy_tags,
+            scorer=fuzz.WRatio,
+            processor=default_process,
             limit=15
         )
     ]
@@ -41,7 +41,11 @@ async def member_converter(
         raise ConversionError('member not found')
 
     if group is None:
-        group = await member.get_group()
+        try:
+            # ? follows the member's group reference instead of searching group member lists
+            group = await member.get_group()
+        except ValueError:
+            raise ConversionError('member not found')
 
     if interaction.author_id not in group.accounts:
         raise ConversionError('member not found')
@@ -1,39 +1,89 @@
-from src.discord import MessageCreateEvent, MessageUpdateEvent, MessageReactionAddEvent, Channel, MessageType, Interaction, ApplicationCommandInteractionData, MessageComponentInteractionData, ModalSubmitInteractionData, ApplicationCommandOptionType, Snowflake, ApplicationCommandType, ActionRow, TextInput, CustomIdExtraType, User, Message, InteractionType, ApplicationCommandInteractionDataOption, ComponentType
-from src.discord.commands import commands, ApplicationCommandScope
+from src.discord import MessageCreateEvent, MessageUpdateEvent, MessageReactionAddEvent, Channel, MessageType, Interaction, ApplicationCommandInteractionData, MessageComponentInteractionData, ModalSubmitInteractionData, Snowflake, ApplicationCommandType, ActionRow, TextInput, CustomIdExtraType, User, Message, InteractionType, ApplicationCommandInteractionDataOption, ComponentType
+from src.discord.commands import OptionConverter, resolve_command, option_converters
 from src.db import Message as DBMessage, ProxyMember, Group
+from src.db.projections import GroupIdProjection
 from src.discord.models.modal import CustomIdExtraTypeType
 from .converters import member_converter, group_converter
 from src.discord.listeners import listen, ListenerType
 from .proxy import process_proxy, get_proxy_webhook
+from src.core.supervisor import supervisor, TaskClass
 from src.discord.components import components
 from .autocomplete import on_autocomplete
+from collections.abc import Awaitable, Callable
 from beanie import PydanticObjectId
 from src.models import project
+from functools import partial
 from asyncio import gather
 from typing import Any
 
 
-@listen(ListenerType.MESSAGE_CREATE)
+PROXYABLE_MESSAGE_TYPES = {
+    MessageType.DEFAULT.value,
+    MessageType.REPLY.value
+}
+
+option_converters.update({
+    'member': member_converter,
+    'userproxy': member_converter,
+    'group': group_converter
+})
+
+
+async def _message_prefilter(data: dict) -> bool:
+    author = data.get('author') or {}
+
+    if (
+        not author or
+        author.get('bot') or
+        data.get('webhook_id') is not None or
+        data.get('guild_id') is None or
+        data.get('type') not in PROXYABLE_MESSAGE_TYPES
+    ):
+        return False
+
+    # ? authors without any groups can never be proxied
+    return await Group.find_one(
+        {'accounts': int(author['id'])},
+        projection_model=GroupIdProjection
+    ) is not None
+
+
+async def _reaction_prefilter(data: dict) -> bool:
+    return not (
+        int(data.get('user_id', 0)) == project.application_id or
+        data.get('guild_id') is None or
+        ((data.get('member') or {}).get('user') or {}).get('bot', False) or
+        (data.get('emoji') or {}).get('name') not in {'❌'}
+    )
+
+
+@listen(ListenerType.MESSAGE_CREATE, _message_prefilter)
 async def on_message(message: MessageCreateEvent):
     if (
         not message.author or
         message.author.bot or
-        message.channel is None or
         message.type == MessageType.THREAD_CREATED
     ):
         return
 
+    await message.populate()
+
+    if message.channel is None:
+        return
+
     proxied, app_emojis, token = await process_proxy(message)
 
-    if app_emojis:
-        gather(*[emoji.delete(token) for emoji in app_emojis])
+    for emoji in app_emojis or []:
+        supervisor.spawn(TaskClass.EMOJI_CLEANUP, emoji.delete(token))
 
     if proxied:
         return
 
 
-@listen(ListenerType.MESSAGE_UPDATE)
+@listen(ListenerType.MESSAGE_UPDATE, _message_prefilter)
 async def on_message_edit(message: MessageUpdateEvent):
+    await message.populate()
+
     if message.channel is None:
         return
 
@@ -43,7 +93,7 @@ async def on_message_edit(message: MessageUpdateEvent):
     await on_message(message)
 
 
-@listen(ListenerType.MESSAGE_REACTION_ADD)
+@listen(ListenerType.MESSAGE_REACTION_ADD, _reaction_prefilter)
 async def on_reaction_add(reaction: MessageReactionAddEvent):
     if (
         reaction.user_id == project.application_id or
@@ -114,111 +164,34 @@ async def on_reaction_add(reaction: MessageReactionAddEvent):
 
 async def parse_command_options(
     interaction: Interaction,
-    options: list[ApplicationCommandInteractionDataOption]
+    options: list[ApplicationCommandInteractionDataOption],
+    converters: dict[str, OptionConverter]
 ) -> dict[str, Any]:
-    assert isinstance(interaction.data, ApplicationCommandInteractionData)
-    kwargs: dict[str, Any] = {}
-
-    for option in options:
-        match option.type:
-            case ApplicationCommandOptionType.ATTACHMENT:
-                assert interaction.data.resolved is not None
-                assert interaction.data.resolved.attachments is not None
-                assert isinstance(option.value, str)
-
-                kwargs[option.name] = interaction.data.resolved.attachments[
-                    Snowflake(option.value)]
-            case ApplicationCommandOptionType.USER:
-                assert interaction.data.resolved is not None
-                assert interaction.data.resolved.users is not None
-                assert isinstance(option.value, str)
-
-                kwargs[option.name] = interaction.data.resolved.users[
-                    Snowflake(option.value)]
-            case ApplicationCommandOptionType.CHANNEL:
-                assert interaction.data.resolved is not None
-                assert interaction.data.resolved.channels is not None
-                assert isinstance(option.value, str)
-
-                kwargs[option.name] = interaction.data.resolved.channels[
-                    Snowflake(option.value)]
-            case ApplicationCommandOptionType.STRING:
-                assert isinstance(option.value, str)
-                match option.name:
-                    case 'member' | 'userproxy':
-                        converter = member_converter
-                    case 'group':
-                        converter = group_converter
-                    case _:
-                        kwargs[option.name] = option.value
-                        continue
-
-                kwargs[option.name] = await converter(
-                    interaction,
-                    {
-                        o.name: o
-                        for o in options
-                    },
-                    option.value
-                )
-            case _:
-                kwargs[option.name] = option.value
+    named_options = {
+        option.name: option
+        for option in options
+    }
 
-    return kwargs
+    return {
+        option.name: (
+            await converter(interaction, named_options, option.value)
+            if (converter := converters.get(option.name)) is not None else
+            option.value
+        )
+        for option in options
+    }
 
 
 async def _on_application_command(interaction: Interaction) -> None:
     assert isinstance(interaction.data, ApplicationCommandInteractionData)
 
-    scope = (
-        ApplicationCommandScope.PRIMARY
-        if interaction.application_id == project.application_id else
-        ApplicationCommandScope.USERPROXY
+    (command, callback, converters), options = await resolve_command(
+        interaction.application_id,
+        interaction.data
     )
-    command = commands[scope].get(interaction.data.name)
-
-    if (
-        command is None and
-        scope == ApplicationCommandScope.USERPROXY and
-        (
-            member := await ProxyMember.find_one(
-            {'userproxy.bot_id': interaction.application_id})
-        ) is not None and
-        member.userproxy is not None and
-        member.userproxy.command == interaction.data.name
-    ):
-        command = commands[ApplicationCommandScope.USERPROXY].get('proxy')
-
-    if command is None:
-        raise ValueError(
-            f'no command found for {interaction.data.name}')
-
-    callback = command.callback
-    command_options = command.options or []
-    options = interaction.data.options or []
-
-    while callback is None:
-        subcommand = options[0]
-        for option in command_options:
-
-            if subcommand.name == option.name:
-
-                match option.type:
-                    case ApplicationCommandOptionType.SUB_COMMAND_GROUP:
-                        command_options = option.options or []
-                        options = subcommand.options or []
-                    case ApplicationCommandOptionType.SUB_COMMAND:
-                        options = subcommand.options or []
-                        callback = option.callback
-                    case _:
-                        continue
-                break
-        else:
-            raise ValueError(
-                f'no callback found for {interaction.data.name}')
 
     kwargs: dict[str, Any] = await parse_command_options(
-        interaction, options
+        interaction, options, converters
     )
 
     match command.type:
@@ -235,39 +208,85 @@ async def _on_application_command(interaction: Interaction) -> None:
     await callback(interaction, **kwargs)
 
 
+async def _resolve_channel(
+    interaction: Interaction,
+    channel_id: Snowflake
+) -> Channel:
+    if interaction.channel is not None and interaction.channel.id == channel_id:
+        return interaction.channel
+
+    return await Channel.fetch(channel_id)
+
+
+async def _resolve_message(
+    interaction: Interaction,
+    channel_id: Snowflake,
+    message_id: Snowflake
+) -> Message:
+    message = await Message.fetch(channel_id, message_id, populate=False)
+
+    # ? the interaction is already populated, and the message is almost always in its channel.
+    # ? anything else the callback needs it can populate itself
+    if interaction.channel is not None and interaction.channel.id == message.channel_id:
+        message.channel = interaction.channel
+        message.guild = interaction.guild
+    else:
+        await message.populate()
+
+    return message
+
+
 async def parse_custom_id(
+    interaction: Interaction,
     custom_id: str
 ) -> tuple[str, list[CustomIdExtraTypeType]]:
     base, *extras = custom_id.split('.')
-    args = []
+    args: list[CustomIdExtraTypeType] = []
+    # ? argument index -> fetch, all fetched at once instead of one after another.
+    # ? only started once every extra has parsed, so a bad one leaves nothing unawaited
+    pending: dict[int, Callable[[], Awaitable[CustomIdExtraTypeType]]] = {}
+
     for arg in extras:
         match CustomIdExtraType(arg[0]):
             case CustomIdExtraType.NONE:
                 args.append(None)
+                continue
             case CustomIdExtraType.STRING:
                 args.append(arg[1:])
+                continue
             case CustomIdExtraType.INTEGER:
                 args.append(int(arg[1:]))
+                continue
             case CustomIdExtraType.BOOLEAN:
                 args.append(bool(int(arg[1:])))
+                continue
             case CustomIdExtraType.USER:
-                args.append(await User.fetch(Snowflake(arg[1:])))
+                pending[len(args)] = partial(User.fetch, Snowflake(arg[1:]))
             case CustomIdExtraType.CHANNEL:
-                args.append(await Channel.fetch(Snowflake(arg[1:])))
+                pending[len(args)] = partial(
+                    _resolve_channel, interaction, Snowflake(arg[1:]))
             case CustomIdExtraType.MEMBER:
-                args.append(await ProxyMember.get(PydanticObjectId(arg[1:])))
+                pending[len(args)] = partial(
+                    ProxyMember.get, PydanticObjectId(arg[1:]))
             case CustomIdExtraType.GROUP:
-                args.append(await Group.get(PydanticObjectId(arg[1:])))
+                pending[len(args)] = partial(
+                    Group.get, PydanticObjectId(arg[1:]))
             case CustomIdExtraType.MESSAGE:
-                args.append(
-                    await Message.fetch(
-                        *(Snowflake(i) for i in arg[1:].split(':')),
-                        populate=True
-                    )
+                pending[len(args)] = partial(
+                    _resolve_message,
+                    interaction,
+                    *(Snowflake(i) for i in arg[1:].split(':'))
                 )
             case _:
                 raise ValueError(f'invalid extra type `{arg}`')
 
+        args.append(None)
+
+    for index, value in zip(pending, await gather(*[
+        fetch() for fetch in pending.values()
+    ])):
+        args[index] = value
+
     return base, args
 
 
@@ -275,6 +294,7 @@ async def _on_message_component(interaction: Interaction) -> None:
     assert isinstance(interaction.data, MessageComponentInteractionData)
 
     component_name, args = await parse_custom_id(
+        interaction,
         interaction.data.custom_id
     )
 
@@ -295,6 +315,7 @@ async def _on_modal_submit(interaction: Interaction) -> None:
     assert isinstance(interaction.data, ModalSubmitInteractionData)
 
     modal_name, args = await parse_custom_id(
+        interaction,
         interaction.data.custom_id
     )
 
@@ -1,7 +1,8 @@
 from src.discord import Emoji, MessageCreateEvent, Message, Permission, Channel, Snowflake, Webhook, Embed, AllowedMentions, StickerFormatType
-from src.db import ProxyMember, Latch, Group, Webhook as DBWebhook, Message as DBMessage, HTTPCache
+from src.db import ProxyMember, ProxyProfile, Latch, Webhook as DBWebhook, Message as DBMessage, HTTPCache
 from regex import finditer, Match, escape, match, IGNORECASE, sub
 from src.models import project, DebugMessage
+from src.core.supervisor import supervisor, TaskClass
 from src.errors import Forbidden, NotFound
 from src.discord.http import get_from_cdn
 from dataclasses import dataclass
@@ -100,7 +101,13 @@ async def get_proxy_for_message(
     if debug_log is None:
         debug_log = []
 
-    groups = await Group.find_many({'accounts': message.author.id}).to_list()
+    # ? everything needed to make the decision is on the account's profile
+    profile = await ProxyProfile.fetch(message.author.id)
+
+    if profile is None:
+        debug_log.append(DebugMessage.AUTHOR_NO_TAGS)
+
+        return None, None, None, None
 
     channel_ids: set[Snowflake | None] = {
         message.channel.id,
@@ -120,15 +127,23 @@ async def get_proxy_for_message(
     debug_reason = []
 
     # ? get global latch if it exists
-    latch = await Latch.find_one({'user': message.author.id, 'guild': None})
+    latch_entry = profile.get_latch(None)
 
-    if latch is None or latch.enabled is False:
+    if latch_entry is None or latch_entry.enabled is False:
         # ? if it doesn't exist or is disabled, get the guild latch
-        latch = await Latch.find_one({'user': message.author.id, 'guild': message.guild.id})
+        latch_entry = profile.get_latch(message.guild.id)
+
+    # ? the latch document is only needed when it can be used or updated
+    latch = (
+        await Latch.get(latch_entry.id)
+        if latch_entry is not None and latch_entry.enabled else
+        None
+    )
 
     latch_return: tuple[ProxyMember, str, Latch, str] | None = None
+    latch_member_id = None
 
-    for group in groups.copy():
+    for group in profile.groups:
         if (  # ? this is a mess, if the system restricts channels and the message isn't in one of them, skip
             group.channels and
             not any(
@@ -141,20 +156,11 @@ async def get_proxy_for_message(
                     DebugMessage.GROUP_CHANNEL_RESTRICTED.format(group.name))
             continue
 
-        for member_id in group.members.copy():
-            member = await ProxyMember.get(member_id)
-
-            if member is None:
-                continue
-
+        for member in group.members:
             if latch and latch.enabled and latch.member == member.id:
                 # ? putting this here, if there are proxy tags given, prioritize them
                 # ? also having this check here ensures that channels are still checked
-                latch_return = member, message.content, latch, (
-                    DebugMessage.MATCHED_FROM_LATCH_GUILD
-                    if latch.guild == message.guild.id else
-                    DebugMessage.MATCHED_FROM_LATCH_GLOBAL
-                )
+                latch_member_id = member.id
 
             for proxy_tag in member.proxy_tags:
                 if not proxy_tag.prefix and not proxy_tag.suffix:
@@ -176,15 +182,31 @@ async def get_proxy_for_message(
                     if not _ensure_proxy_preserves_mentions(check):
                         continue
 
+                    proxy_member = await ProxyMember.get(member.id)
+
+                    if proxy_member is None:
+                        continue
+
                     if latch is not None and latch.enabled and not latch.fronting:
-                        latch.member = member.id
+                        latch.member = proxy_member.id
                         await latch.save_changes()
 
-                    return member, check.group(2), latch, (
+                    return proxy_member, check.group(2), latch, (
                         DebugMessage.MATCHED_FROM_TAGS.format(prefix, suffix)
                     )
 
-    if latch is None:
+    if (
+        latch is not None and
+        latch_member_id is not None and
+        (proxy_member := await ProxyMember.get(latch_member_id)) is not None
+    ):
+        latch_return = proxy_member, message.content, latch, (
+            DebugMessage.MATCHED_FROM_LATCH_GUILD
+            if latch.guild == message.guild.id else
+            DebugMessage.MATCHED_FROM_LATCH_GLOBAL
+        )
+
+    if latch_entry is None:
         debug_log.append(DebugMessage.AUTHOR_NO_TAGS)
 
         return None, None, None, None
@@ -253,13 +275,14 @@ async def get_proxy_webhook(channel: Channel, use_cache: bool = True) -> Webhook
                 use_cache,
                 with_token=False)
         except NotFound:
-            gather(
+            for task in (
                 webhook.delete(),
                 HTTPCache.invalidate(webhook.url.split('/api')[1]),
                 HTTPCache.invalidate(
                     webhook.url.split('/api')[1].rsplit('/', 1)[0]),
                 HTTPCache.invalidate(f'/channels/{channel.id}/webhooks')
-            )
+            ):
+                supervisor.spawn(TaskClass.WEBHOOK_CLEANUP, task)
 
     for webhook in await channel.fetch_webhooks(use_cache):
         if webhook.name == '/plu/ral proxy':
@@ -551,8 +574,8 @@ async def process_proxy(
         if success:
             return True, app_emojis, token
 
-        if app_emojis:
-            gather(*[emoji.delete(token) for emoji in app_emojis])
+        for emoji in app_emojis or []:
+            supervisor.spawn(TaskClass.EMOJI_CLEANUP, emoji.delete(token))
 
         token = project.bot_token
 
@@ -609,7 +632,12 @@ async def process_proxy(
             for sticker in message.sticker_items
         ]
 
-    group = await member.get_group()
+    profile = await ProxyProfile.get(message.author.id)
+    group = (
+        profile.get_group_of(member.id)
+        if profile is not None else
+        None
+    ) or await member.get_group()
 
     responses = await gather(
         message.delete(reason='/plu/ral proxy'),
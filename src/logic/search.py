@@ -0,0 +1,169 @@
+from __future__ import annotations
+from src.db.invalidation import invalidator, WATCHED_CACHE_EXPIRATION
+from rapidfuzz.utils import default_process
+from beanie import PydanticObjectId
+from collections import OrderedDict
+from rapidfuzz import process, fuzz
+from typing import NamedTuple
+from src.db import ProxyProfile
+from time import monotonic
+
+
+# ? used instead of the change stream expiration when change streams aren't available
+SEARCH_INDEX_TTL = 30
+SEARCH_INDEX_MAX_ACCOUNTS = 4096
+
+
+class MemberSearchEntry(NamedTuple):
+    id: PydanticObjectId
+    name: str
+    group_id: PydanticObjectId
+    group_name: str
+    userproxy: bool
+
+
+class GroupSearchEntry(NamedTuple):
+    id: PydanticObjectId
+    name: str
+
+
+class AccountSearchIndex:
+    # ? names are preprocessed once, every keystroke only scores against the prepared choices
+    def __init__(self, profile: ProxyProfile | None) -> None:
+        groups = profile.groups if profile is not None else []
+
+        self.groups = [
+            GroupSearchEntry(group.id, group.name)
+            for group in groups
+        ]
+        self.group_choices = [
+            default_process(group.name)
+            for group in self.groups
+        ]
+        self.members = [
+            MemberSearchEntry(
+                member.id,
+                member.name,
+                group.id,
+                group.name,
+                member.userproxy
+            )
+            for group in groups
+            for member in group.members
+        ]
+        self._member_choices: dict[
+            tuple[str | None, bool],
+            tuple[list[MemberSearchEntry], list[str]]
+        ] = {}
+        self.expires = monotonic() + (
+            WATCHED_CACHE_EXPIRATION.total_seconds()
+            if invalidator.active else
+            SEARCH_INDEX_TTL
+        )
+
+    def _members(
+        self,
+        group_name: str | None,
+        userproxies_only: bool
+    ) -> tuple[list[MemberSearchEntry], list[str]]:
+        key = (group_name, userproxies_only)
+
+        if (choices := self._member_choices.get(key)) is None:
+            members = [
+                member
+                for member in self.members
+                if (group_name is None or member.group_name == group_name)
+                and (not userproxies_only or member.userproxy)
+            ]
+
+            choices = self._member_choices[key] = (
+                members,
+                [default_process(member.name) for member in members]
+            )
+
+        return choices
+
+    def search_members(
+        self,
+        query: str,
+        group_name: str | None = None,
+        userproxies_only: bool = False,
+        limit: int = 10,
+        score_cutoff: float = 60
+    ) -> list[MemberSearchEntry]:
+        members, choices = self._members(group_name, userproxies_only)
+
+        if not (query := default_process(query)):
+            return members[:25]
+
+        return [
+            members[index]
+            for _, _, index in
+            process.extract(
+                query,
+                choices,
+                scorer=fuzz.WRatio,
+                processor=None,
+                limit=limit,
+                score_cutoff=score_cutoff
+            )
+        ]
+
+    def search_groups(
+        self,
+        query: str,
+        limit: int = 10
+    ) -> list[GroupSearchEntry]:
+        if not (query := default_process(query)):
+            return self.groups[:25]
+
+        return [
+            self.groups[index]
+            for _, _, index in
+            process.extract(
+                query,
+                self.group_choices,
+                scorer=fuzz.WRatio,
+                processor=None,
+                limit=limit
+            )
+        ]
+
+
+class SearchIndexCache:
+    def __init__(self, max_accounts: int) -> None:
+        self.max_accounts = max_accounts
+        self._indexes: OrderedDict[int, AccountSearchIndex] = OrderedDict()
+        self._generation = 0
+
+    def invalidate(self, account_id: int) -> None:
+        self._generation += 1
+        self._indexes.pop(account_id, None)
+
+    async def get(self, account_id: int) -> AccountSearchIndex:
+        index = self._indexes.get(account_id)
+
+        if index is not None and index.expires > monotonic():
+            self._indexes.move_to_end(account_id)
+            return index
+
+        generation = self._generation
+        index = AccountSearchIndex(await ProxyProfile.fetch(account_id))
+
+        if generation != self._generation:
+            # ? invalidated while building, the next keystroke rebuilds it
+            return index
+
+        self._indexes[account_id] = index
+        self._indexes.move_to_end(account_id)
+
+        while len(self._indexes) > self.max_accounts:
+            self._indexes.popitem(last=False)
+
+        return index
+
+
+search_indexes = SearchIndexCache(SEARCH_INDEX_MAX_ACCOUNTS)
+
+# ? profiles are rebuilt on every member, group and latch change, on any replica
+invalidator.register('proxy_profiles', search_indexes.invalidate)
@@ -9,12 +9,33 @@ USERPROXY_FOOTER = '\n\na plural proxy for @{username} powered by /plu/ral\nhttp
 USERPROXY_FOOTER_LIMIT = 400 - len(USERPROXY_FOOTER.format(username='*' * 32))
 
 
+class HTTPTrafficMode(StrEnum):
+    OFF = 'off'
+    RECORD = 'record'
+    REPLAY = 'replay'
+
+
+class BlobBackend(StrEnum):
+    FILESYSTEM = 'filesystem'
+    GRIDFS = 'gridfs'
+
+
 class Project(BaseModel):
     class Images(BaseModel):
         base_url: str
         account_id: str
         token: str
 
+    class HTTPTraffic(BaseModel):
+        mode: HTTPTrafficMode = HTTPTrafficMode.OFF
+        file: str = 'http_traffic.jsonl'
+
+    class Blobs(BaseModel):
+        backend: BlobBackend = BlobBackend.FILESYSTEM
+        path: str = 'blobs'
+        chunk_size: int = 256 * 1024
+        sweep_interval: int = 60 * 60
+
     bot_token: str
     bot_public_key: str
     mongo_uri: str
@@ -26,6 +47,8 @@ class Project(BaseModel):
     logfire_token: str
     dev_environment: bool = True
     images: Images
+    http_traffic: HTTPTraffic = HTTPTraffic()
+    blobs: Blobs = Blobs()
 
     @property
     def application_id(self) -> int:
@@ -3,4 +3,6 @@ from .pluralkit import PluralKitExport
 from .tupperbox import TupperboxExport
 from .standard import StandardExport
 from .plural import PluralExport
+from .stream import read_export, ExportFormatError, ExportTooLarge
+from .export import export_account, MAX_ATTACHMENT_SIZE
 from .log import LogMessage
@@ -0,0 +1,213 @@
+from __future__ import annotations
+from asyncio import Future, Semaphore, Task, TimerHandle, create_task, get_running_loop, shield, sleep
+from src.core.supervisor import supervisor, TaskClass
+from src.discord.http import _get_mime_type_for_image, stream_from_cdn
+from src.errors import HTTPException, NotFound, Forbidden
+from src.db.blobs import blob_store
+from typing import TYPE_CHECKING, NamedTuple
+from contextlib import aclosing
+from urllib.parse import urlparse
+from src.models import project
+from src.db import CFCDNProxy
+import logfire
+
+if TYPE_CHECKING:
+    from src.discord import Embed
+
+
+MAX_AVATAR_SIZE = 10_485_760
+# ? avatars on these hosts are already permanent, they don't need migrating
+PASSTHROUGH_HOSTS = {'cdn.plural.gg', 'cdn.pluralkit.me', 'cdn.tupperbox.app'}
+REFRESH_HOSTS = {'cdn.discordapp.com', 'media.discordapp.net'}
+
+
+class StoredAvatar(NamedTuple):
+    target_url: str
+    blob: str
+    size: int
+    content_type: str
+
+
+class AvatarMigrator:
+    # ? discord attachment urls expire, sending them in a message gets discord to embed a
+    # ? refreshed url. several urls share one message, and each source url is only ever
+    # ? migrated once per import no matter how many members use it
+    BATCH_SIZE = 5
+    BATCH_WINDOW = 0.25
+    POLL_ATTEMPTS = 4
+    POLL_INTERVAL = 0.75
+
+    def __init__(
+        self,
+        refresh_concurrency: int = 2,
+        download_concurrency: int = 8
+    ) -> None:
+        # ? sends share the import channel's rate limit, so only a couple are in flight
+        self._refresh_semaphore = Semaphore(refresh_concurrency)
+        self._download_semaphore = Semaphore(download_concurrency)
+        self._results: dict[str, Future[str | StoredAvatar | None]] = {}
+        self._queue: list[str] = []
+        self._flush_handle: TimerHandle | None = None
+        self._tasks: set[Task] = set()
+
+    async def resolve(self, url: str) -> str | StoredAvatar | None:
+        """returns the url or stored copy to set the avatar from, 'pass' to leave it unset, or None if it failed"""
+        if (future := self._results.get(url)) is None:
+            future = self._results[url] = get_running_loop().create_future()
+
+            match urlparse(url).hostname:
+                case host if host in REFRESH_HOSTS:
+                    self._enqueue(url)
+                case host if host in PASSTHROUGH_HOSTS:
+                    future.set_result('pass')
+                case _:  # ? might restrict avatar sources later
+                    future.set_result(url)
+
+        return await shield(future)
+
+    def _spawn(self, coro) -> None:
+        task = create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _enqueue(self, url: str) -> None:
+        self._queue.append(url)
+
+        if len(self._queue) >= self.BATCH_SIZE:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = get_running_loop().call_later(
+                self.BATCH_WINDOW, self._flush)
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._queue = self._queue, []
+
+        if batch:
+            self._spawn(self._refresh(batch))
+
+    def _resolve(self, url: str, result: str | StoredAvatar | None) -> None:
+        if not (future := self._results[url]).done():
+            future.set_result(result)
+
+    @staticmethod
+    def _match_embeds(
+        urls: list[str],
+        embeds: list[Embed]
+    ) -> dict[str, str]:
+        images = [
+            (embed.url, image.url)
+            for embed in embeds
+            if (image := embed.image or embed.thumbnail) is not None
+        ]
+
+        matched = {
+            embed_url: image_url
+            for embed_url, image_url in images
+            if embed_url in urls
+        }
+
+        unmatched_urls = [url for url in urls if url not in matched]
+        unmatched_images = [
+            image_url
+            for embed_url, image_url in images
+            if embed_url not in matched
+        ]
+
+        # ? discord sometimes normalizes the embed url, embeds are in the same order as the urls
+        if len(unmatched_urls) == len(unmatched_images):
+            matched.update(zip(unmatched_urls, unmatched_images))
+
+        return matched
+
+    async def _refresh(self, urls: list[str]) -> None:
+        from src.discord import Message as DiscordMessage
+
+        try:
+            async with self._refresh_semaphore:
+                message = await DiscordMessage.send(
+                    project.import_proxy_channel_id,
+                    content='\n'.join(urls))
+
+                for attempt in range(self.POLL_ATTEMPTS):
+                    if len(self._match_embeds(urls, message.embeds)) == len(urls):
+                        break
+
+                    await sleep(self.POLL_INTERVAL)
+                    message = await DiscordMessage.fetch(
+                        project.import_proxy_channel_id,
+                        message.id,
+                        populate=False)
+
+            supervisor.spawn(TaskClass.MESSAGE_CLEANUP, message.delete())
+        except Exception as e:
+            logfire.error('failed to refresh avatar urls', _exc_info=e)
+
+            for url in urls:
+                self._resolve(url, None)
+
+            return
+
+        refreshed = self._match_embeds(urls, message.embeds)
+
+        for url in urls:
+            if (image_url := refreshed.get(url)) is None:
+                self._resolve(url, None)
+            else:
+                self._spawn(self._download(url, image_url))
+
+    async def _download(self, url: str, image_url: str) -> None:
+        try:
+            async with self._download_semaphore:
+                self._resolve(url, await self._store(url, image_url))
+        except Exception as e:
+            logfire.error('failed to download avatar', _exc_info=e)
+            self._resolve(url, None)
+
+    async def _store(self, url: str, image_url: str) -> StoredAvatar | None:
+        data = bytearray()
+
+        # ? through the cdn helper so the download is recorded and replayed like any other
+        try:
+            async with aclosing(stream_from_cdn(image_url, 8192)) as chunks:
+                async for chunk in chunks:
+                    data.extend(chunk)
+
+                    if len(data) > MAX_AVATAR_SIZE:
+                        return None
+        except (NotFound, Forbidden, HTTPException):
+            return None
+
+        try:
+            content_type = _get_mime_type_for_image(bytes(data[:16]))
+        except ValueError:
+            return None
+
+        return StoredAvatar(
+            target_url=url,
+            blob=await blob_store.put(bytes(data)),
+            size=len(data),
+            content_type=content_type
+        )
+
+    @staticmethod
+    async def prepare(resolved: str | StoredAvatar) -> str | None:
+        """returns the url to upload from, call right before uploading"""
+        if isinstance(resolved, str):
+            return resolved
+
+        # ? proxies expire after five minutes, creating them any earlier loses them on large imports
+        if await blob_store.stat(resolved.blob) is None:
+            return None
+
+        proxy = await CFCDNProxy(
+            target_url=resolved.target_url,
+            blob=resolved.blob,
+            size=resolved.size,
+            content_type=resolved.content_type
+        ).insert()
+
+        return proxy.proxy_url
@@ -1,6 +1,10 @@
+from __future__ import annotations
+from typing import Self, TYPE_CHECKING
 from pydantic import BaseModel
 from .log import LogMessage
-from typing import Self
+
+if TYPE_CHECKING:
+    from .standard import StandardExport
 
 
 class BaseExport(BaseModel):
@@ -18,3 +22,6 @@ class BaseExport(BaseModel):
     @classmethod
     async def from_dict(cls, data: dict) -> Self:
         return cls(**data)
+
+    def to_standard(self) -> StandardExport:
+        raise NotImplementedError
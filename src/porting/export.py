@@ -0,0 +1,130 @@
+from __future__ import annotations
+from src.db import ApiKey, Group, ProxyMember, Message, Latch, Reply
+from tempfile import SpooledTemporaryFile
+from collections.abc import AsyncIterable
+from pydantic import BaseModel
+from .plural import PluralExport
+from datetime import datetime
+from gzip import GzipFile
+from typing import IO
+from orjson import dumps
+
+
+# ? small exports never touch the disk
+EXPORT_SPOOL_SIZE = 8 * 1024 * 1024
+EXPORT_COMPRESSION_LEVEL = 6
+# ? discord's upload limit for bots
+MAX_ATTACHMENT_SIZE = 10_485_760
+
+
+async def _write_array(
+    out: GzipFile,
+    documents: AsyncIterable[BaseModel]
+) -> None:
+    out.write(b'[')
+    first = True
+
+    async for document in documents:
+        if not first:
+            out.write(b',')
+
+        out.write(document.model_dump_json().encode())
+        first = False
+
+    out.write(b']')
+
+
+async def _write_full(out: GzipFile, account_id: int) -> None:
+    # ? matches PluralExport.model_dump_json, one document at a time
+    groups = await Group.find({'accounts': account_id}).to_list()
+
+    members = ProxyMember.find(
+        {'_id': {'$in': [
+            member_id
+            for group in groups
+            for member_id in group.members]}},
+        ignore_cache=True)
+
+    api_key = await ApiKey.find_one({'_id': account_id})
+
+    out.write(b'{"timestamp":' + dumps(datetime.utcnow()))
+    out.write(b',"api_key":' + (
+        api_key.model_dump_json().encode()
+        if api_key is not None else
+        b'null'))
+
+    out.write(b',"groups":[' + b','.join(
+        group.model_dump_json().encode()
+        for group in groups
+    ) + b']')
+
+    userproxy_bot_ids = set()
+
+    async def track_userproxies() -> AsyncIterable[ProxyMember]:
+        async for member in members:
+            if member.userproxy is not None:
+                userproxy_bot_ids.add(member.userproxy.bot_id)
+
+            yield member
+
+    out.write(b',"members":')
+    await _write_array(out, track_userproxies())
+
+    out.write(b',"messages":')
+    await _write_array(
+        out,
+        Message.find({'author_id': account_id}, ignore_cache=True))
+
+    out.write(b',"latches":')
+    await _write_array(
+        out,
+        Latch.find({'user': account_id}, ignore_cache=True))
+
+    out.write(b',"replies":')
+    await _write_array(
+        out,
+        Reply.find(
+            {'bot_id': {'$in': list(userproxy_bot_ids)}},
+            ignore_cache=True))
+
+    out.write(b'}')
+
+
+async def _write_standard(out: GzipFile, account_id: int) -> None:
+    # ? the standard format only has groups and members, which are small enough to build whole
+    groups = await Group.find({'accounts': account_id}).to_list()
+
+    out.write(PluralExport(
+        api_key=None,
+        groups=groups,
+        members=await ProxyMember.find(
+            {'_id': {'$in': [
+                member_id
+                for group in groups
+                for member_id in group.members]}}
+        ).to_list(),
+        messages=[],
+        latches=[],
+        replies=[]
+    ).to_standard().model_dump_json().encode())
+
+
+async def export_account(account_id: int, format: str) -> IO[bytes]:
+    """writes a gzipped export to a temporary file, rewound and ready to upload"""
+    file = SpooledTemporaryFile(EXPORT_SPOOL_SIZE)
+
+    with GzipFile(
+        filename=f'plural_export_{format}.json',
+        mode='wb',
+        fileobj=file,
+        compresslevel=EXPORT_COMPRESSION_LEVEL
+    ) as out:
+        match format:
+            case 'full':
+                await _write_full(out, account_id)
+            case _:
+                await _write_standard(out, account_id)
+
+    file.seek(0)
+
+    return file
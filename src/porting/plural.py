@@ -1,14 +1,16 @@
 from __future__ import annotations
-from src.db import ApiKey, Group, ProxyMember, Message, Latch, Reply, CFCDNProxy
-from src.core.session import session
+from src.db import ApiKey, Group, ProxyMember, Message, Latch, Reply, ProxyProfile
+from motor.motor_asyncio import AsyncIOMotorClientSession
+from collections.abc import Awaitable, Callable
+from src.db.projections import MemberNameProjection, GroupAccountsProjection
+from src.db.helpers import avatar_initializer
+from pymongo.errors import OperationFailure
 from beanie import PydanticObjectId
-from urllib.parse import urlparse
-from asyncio import gather, sleep
+from asyncio import Semaphore, gather
 from typing import TYPE_CHECKING
-from asyncio import create_task
-from src.models import project
 from datetime import datetime
 from .base import BaseExport
+from .avatars import AvatarMigrator
 from .log import LogMessage
 from pydantic import Field
 
@@ -16,6 +18,12 @@ if TYPE_CHECKING:
     from .standard import StandardExport
 
 
+IMPORT_BATCH_SIZE = 500
+AVATAR_CONCURRENCY = 4
+# ? IllegalOperation, returned by standalone servers
+TRANSACTIONS_UNSUPPORTED_CODES = {20}
+
+
 class PluralExport(BaseExport):
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     api_key: ApiKey | None
@@ -224,39 +232,65 @@ class PluralExport(BaseExport):
             ]
         )
 
-    async def import_to_account(self, account_id: int) -> list[LogMessage | str]:
-        tasks = []
+    @property
+    def pending_avatars(self) -> list[tuple[ProxyMember | Group, str]]:
+        if getattr(self, '_pending_avatars', None) is None:
+            self._pending_avatars: list[tuple[ProxyMember | Group, str]] = []
+
+        return self._pending_avatars
+
+    async def _bulk_write(
+        self,
+        groups: list[Group],
+        members: list[ProxyMember],
+        additions: dict[PydanticObjectId, set[PydanticObjectId]],
+        session: AsyncIOMotorClientSession | None = None
+    ) -> None:
+        for index in range(0, len(members), IMPORT_BATCH_SIZE):
+            await ProxyMember.insert_many(
+                members[index:index + IMPORT_BATCH_SIZE], session=session)
+
+        for index in range(0, len(groups), IMPORT_BATCH_SIZE):
+            await Group.insert_many(
+                groups[index:index + IMPORT_BATCH_SIZE], session=session)
+
+        for group_id, member_ids in additions.items():
+            await Group.find({'_id': group_id}).update(
+                {'$addToSet': {'members': {'$each': list(member_ids)}}},
+                session=session)
 
+    async def import_to_account(self, account_id: int) -> list[LogMessage | str]:
+        """writes groups and members in bulk, avatars are left in pending_avatars for import_avatars"""
         existing_groups = {
             group.name: group
             for group in await Group.find({'accounts': account_id}).to_list()
         }
 
-        existing_members = {
-            group.name: {
-                member.name: member
-                for member in await group.get_members()
-            }
-            for group in existing_groups.values()
+        existing_members: dict[str, set[str]] = {
+            group.name: set()
+            for group in self.groups
         }
 
-        existing_members.update({
-            group.name: {}
-            for group in self.groups
-            if group.name not in existing_members
-        })
+        for group in existing_groups.values():
+            existing_members[group.name] = {
+                member.name
+                for member in await ProxyMember.find(
+                    {'_id': {'$in': list(group.members)}},
+                    projection_model=MemberNameProjection
+                ).to_list()
+            }
 
         member_map = {
             member.id: member
-            for member in self.members+[
-                member
-                for d in existing_members.values()
-                for member in d.values()
-            ]
+            for member in self.members
         }
 
+        # ? everything is checked before anything is written
+        new_groups: list[Group] = []
+        new_members: list[ProxyMember] = []
+        additions: dict[PydanticObjectId, set[PydanticObjectId]] = {}
+
         for local_group in self.groups:
-            changes_made = False
             if local_group.name in existing_groups:
                 self.logs.append(
                     LogMessage.GROUP_EXISTS.format(group_name=local_group.name))
@@ -265,7 +299,8 @@ class PluralExport(BaseExport):
             else:
                 local_group.accounts = {account_id}
                 group = local_group
-                changes_made = True
+
+            group_members = set()
 
             for member_id in local_group.members:
                 member = member_map[member_id]
@@ -276,107 +311,142 @@ class PluralExport(BaseExport):
                             member_name=member.name, group_name=group.name))
                     continue
 
-                group.members.add(member.id)
-                changes_made = True
+                existing_members[group.name].add(member.name)
+                group_members.add(member.id)
 
-                tasks.append(
-                    self._save_object_with_avatar(member, url)
-                    if (url := self.avatar_map.get(member_id)) is not None
-                    else member.save()
-                )
+                if member.group is not None:
+                    continue  # ? already imported through another group
 
-            if changes_made:
-                tasks.append(
-                    self._save_object_with_avatar(group, url)
-                    if (url := self.avatar_map.get(group.id)) is not None
-                    else group.save()
-                )
+                member.group = group.id
+                new_members.append(member)
 
-        if not tasks:
-            self.logs.append(LogMessage.NOTHING_IMPORTED)
-            return self.logs
+                if (url := self.avatar_map.get(member.id)) is not None:
+                    self.pending_avatars.append((member, url))
 
-        await gather(*tasks)
-
-        return self.logs
+            if group is local_group:
+                group.members = group_members
+                new_groups.append(group)
 
-    async def _refresh_discord_image(self, object_type: str, object_name: str, url: str) -> str | None:
-        from src.discord import Message as DiscordMessage
+                if (url := self.avatar_map.get(group.id)) is not None:
+                    self.pending_avatars.append((group, url))
+            elif group_members:
+                additions.setdefault(group.id, set()).update(group_members)
 
-        message = await DiscordMessage.send(
-            project.import_proxy_channel_id,
-            content=url)
-
-        for _ in range(2):
-            if message.embeds and (message.embeds[0].image or message.embeds[0].thumbnail):
-                break
-
-            await sleep(1)
-            message = await DiscordMessage.fetch(project.import_proxy_channel_id, message.id)
-        else:
-            create_task(message.delete())
-            self.logs.append(LogMessage.AVATAR_FAILED.format(
-                object_type=object_type, object_name=object_name))
-            return None
-
-        image = message.embeds[0].image or message.embeds[0].thumbnail
-        assert image is not None
-
-        create_task(message.delete())
-
-        async with session.get(image.url) as resp:
-            content_length = resp.headers.get('Content-Length')
-            if content_length and int(content_length) > 10_485_760:
-                self.logs.append(LogMessage.AVATAR_FAILED.format(
-                    object_type=object_type, object_name=object_name))
-                return None
-
-            data = bytearray()
-
-            async for chunk in resp.content.iter_chunked(8192):
-                data.extend(chunk)
-
-                if len(data) > 10_485_760:
-                    self.logs.append(LogMessage.AVATAR_FAILED.format(
-                        object_type=object_type, object_name=object_name))
-                    return None
+        if not new_groups and not new_members:
+            self.logs.append(LogMessage.NOTHING_IMPORTED)
+            return self.logs
 
-        proxy = await CFCDNProxy(target_url=url, data=bytes(data)).save()
+        client = Group.get_motor_collection().database.client
 
-        return proxy.proxy_url
+        try:
+            async with await client.start_session() as session:
+                async with session.start_transaction():
+                    await self._bulk_write(
+                        new_groups, new_members, additions, session)
+        except OperationFailure as e:
+            if e.code not in TRANSACTIONS_UNSUPPORTED_CODES:
+                raise
+
+            # ? standalone servers don't support transactions
+            await self._bulk_write(new_groups, new_members, additions)
+
+        # ? insert_many and query updates don't trigger the profile rebuild hooks
+        await ProxyProfile.rebuild_many({
+            account_id,
+            *[
+                other_account
+                for group in existing_groups.values()
+                if group.id in additions
+                for other_account in group.accounts
+            ]
+        })
 
-    async def _save_object_with_avatar(self, object: ProxyMember | Group, url: str | None) -> None:
-        if url is None:
-            return None
+        return self.logs
 
-        parsed = urlparse(url)
+    async def import_avatars(
+        self,
+        progress: Callable[[int, int], Awaitable[None]] | None = None
+    ) -> list[LogMessage | str]:
+        """runs after import_to_account, returns only the logs from the avatar phase"""
+        logs_before = len(self.logs)
+        migrator = AvatarMigrator()
+        # ? bounds the cloudflare uploads, the migrator bounds discord and downloads itself
+        semaphore = Semaphore(AVATAR_CONCURRENCY)
+        total = len(self.pending_avatars)
+        done = 0
+
+        updated: list[ProxyMember | Group] = []
+
+        async def import_avatar(object: ProxyMember | Group, url: str) -> None:
+            nonlocal done
+
+            if await self._save_object_with_avatar(object, url, migrator, semaphore):
+                updated.append(object)
+
+            done += 1
+
+            if progress is not None:
+                await progress(done, total)
+
+        await gather(*[
+            import_avatar(object, url)
+            for object, url in self.pending_avatars
+        ])
+
+        self.pending_avatars.clear()
+
+        if updated:
+            # ? avatars are set by query, which doesn't trigger the profile rebuild hooks
+            await ProxyProfile.rebuild_many({
+                account_id
+                for group in await Group.find(
+                    {'$or': [
+                        {'_id': {'$in': [
+                            object.id
+                            for object in updated
+                            if isinstance(object, Group)]}},
+                        {'members': {'$in': [
+                            object.id
+                            for object in updated
+                            if isinstance(object, ProxyMember)]}}]},
+                    projection_model=GroupAccountsProjection
+                ).to_list()
+                for account_id in group.accounts
+            })
+
+        return self.logs[logs_before:]
+
+    async def _save_object_with_avatar(
+        self,
+        object: ProxyMember | Group,
+        url: str,
+        migrator: AvatarMigrator,
+        semaphore: Semaphore
+    ) -> bool:
         object_type = 'member' if isinstance(object, ProxyMember) else 'group'
-        object_name = object.name
 
-        match parsed.hostname:
-            case 'cdn.discordapp.com' | 'media.discordapp.net':
-                url = await self._refresh_discord_image(object_type, object_name, url)
-            case 'cdn.plural.gg' | 'cdn.pluralkit.me' | 'cdn.tupperbox.app':
-                url = 'pass'
-            case _:  # ? might restrict avatar sources later
-                pass
+        resolved = await migrator.resolve(url)
 
-        if url is None:
+        if resolved == 'pass':
+            return False
+
+        if resolved is None:
             self.logs.append(
                 LogMessage.AVATAR_FAILED.format(
-                    object_type=object_type, object_name=object_name))
-            return None
-
-        if url == 'pass':
-            await object.save()
-            return None
+                    object_type=object_type, object_name=object.name))
+            return False
 
-        # ? set_avatar calls a save at the end
+        # ? the user may have edited or deleted the object since the import, so it is
+        # ? never saved from here, only its avatar is set
         try:
-            await object.set_avatar(url)
+            async with semaphore:
+                if (avatar_url := await migrator.prepare(resolved)) is None:
+                    raise ValueError('stored avatar is missing')
+
+                return await avatar_initializer(object, avatar_url)
         except Exception:
             self.logs.append(
                 LogMessage.AVATAR_FAILED.format(
-                    object_type=object_type, object_name=object_name))
-        else:
-            await object.save()
+                    object_type=object_type, object_name=object.name))
+
+        return False
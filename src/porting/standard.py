@@ -36,6 +36,9 @@ class StandardExport(BaseExport):
     groups: list[Group] = Field(default_factory=list)
     members: list[Member] = Field(default_factory=list)
 
+    def to_standard(self) -> StandardExport:
+        return self
+
     def to_plural(self) -> PluralExport:
         from .plural import PluralExport
         return PluralExport.from_standard(self, self.logs)
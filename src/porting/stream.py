@@ -0,0 +1,358 @@
+from __future__ import annotations
+from typing import Any, ClassVar, get_args, get_origin
+from collections.abc import AsyncIterator, Iterator
+from pydantic import TypeAdapter
+from .pluralkit import PluralKitExport
+from .tupperbox import TupperboxExport
+from .standard import StandardExport
+from .plural import PluralExport
+from functools import cache
+from .base import BaseExport
+from zlib import decompressobj
+from orjson import loads
+from re import compile
+
+
+# ? decompressed size, stops gzip bombs and anything else absurd
+MAX_EXPORT_SIZE = 256 * 1024 * 1024
+INFLATE_CHUNK_SIZE = 1024 * 1024
+
+_STRUCTURE = compile(rb'["\[\]{}]')
+_SCALAR_END = compile(rb'[\s,\]}]')
+_WHITESPACE = b' \t\r\n'
+
+ExportModel = type[PluralKitExport | PluralExport | TupperboxExport | StandardExport]
+
+# ? top level keys that only appear in one format
+_FORMAT_KEYS: dict[str, ExportModel] = {
+    'tuppers': TupperboxExport,
+    'version': PluralKitExport,
+    'uuid': PluralKitExport,
+    'config': PluralKitExport,
+    'privacy': PluralKitExport,
+    'switches': PluralKitExport,
+    'api_key': PluralExport,
+    'messages': PluralExport,
+    'latches': PluralExport,
+    'replies': PluralExport,
+}
+
+# ? keys that are never used by the import, and are often the bulk of the export
+_SKIPPED_KEYS: dict[ExportModel, dict[str, Any]] = {
+    PluralKitExport: {'switches': []},
+}
+
+
+class ExportFormatError(ValueError):
+    pass
+
+
+class ExportTooLarge(ExportFormatError):
+    pass
+
+
+def _inflate(decompressor: Any, data: bytes) -> Iterator[bytes]:
+    # ? bounded so a tiny compressed chunk can't expand all at once
+    while data:
+        yield decompressor.decompress(data, INFLATE_CHUNK_SIZE)
+        data = decompressor.unconsumed_tail
+
+
+async def _decoded(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    decompressor = None
+    first = True
+    head = b''
+    size = 0
+
+    async for raw in chunks:
+        if first:
+            # ? the gzip magic number might be split across chunks
+            raw = head = head + raw
+
+            if len(head) < 2:
+                continue
+
+            if head[:2] == b'\x1f\x8b':
+                decompressor = decompressobj(31)
+
+        for chunk in (
+            (raw,)
+            if decompressor is None else
+            _inflate(decompressor, raw)
+        ):
+            if first:
+                chunk = chunk.removeprefix(b'\xef\xbb\xbf')
+                first = False
+
+            size += len(chunk)
+
+            if size > MAX_EXPORT_SIZE:
+                raise ExportTooLarge('export is too large')
+
+            yield chunk
+
+    if first and head:
+        yield head
+
+    if decompressor is not None and (chunk := decompressor.flush()):
+        if size + len(chunk) > MAX_EXPORT_SIZE:
+            raise ExportTooLarge('export is too large')
+
+        yield chunk
+
+
+class JsonStreamReader:
+    # ? pulls json values out of a byte stream one at a time, only ever holding the value
+    # ? being read (and none of the values being skipped) in memory
+    def __init__(self, chunks: AsyncIterator[bytes]) -> None:
+        self._chunks = chunks
+        self._buffer = bytearray()
+        self._pos = 0
+        self._eof = False
+
+    async def _fill(self, keep_from: int) -> int:
+        """discards everything before keep_from and reads another chunk, returns how far the buffer shifted"""
+        if self._eof:
+            raise ExportFormatError('unexpected end of export')
+
+        del self._buffer[:keep_from]
+        self._pos -= keep_from
+
+        try:
+            self._buffer.extend(await anext(self._chunks))
+        except StopAsyncIteration:
+            self._eof = True
+
+        return keep_from
+
+    async def peek(self) -> int:
+        while True:
+            while self._pos < len(self._buffer):
+                if self._buffer[self._pos] not in _WHITESPACE:
+                    return self._buffer[self._pos]
+
+                self._pos += 1
+
+            await self._fill(self._pos)
+
+    async def expect(self, *tokens: bytes) -> bytes:
+        token = bytes([await self.peek()])
+
+        if token not in tokens:
+            raise ExportFormatError(
+                f'expected {' or '.join(t.decode() for t in tokens)}, got {token.decode(errors='replace')}')
+
+        self._pos += 1
+        return token
+
+    async def _scan(self, keep: bool) -> tuple[int, int]:
+        await self.peek()
+        start = self._pos
+        first = self._buffer[start]
+
+        if first not in b'{["':
+            while (match := _SCALAR_END.search(self._buffer, start)) is None:
+                if self._eof:
+                    return start, len(self._buffer)
+
+                start -= await self._fill(start)
+
+            return start, match.start()
+
+        depth = 0
+        index = start
+        string_start = None
+
+        while True:
+            if string_start is not None:
+                end = self._buffer.find(b'"', index)
+
+                if end != -1:
+                    escapes = 0
+                    while self._buffer[end - 1 - escapes] == 0x5c:
+                        escapes += 1
+
+                    index = end + 1
+
+                    if not escapes % 2:
+                        string_start = None
+
+                        if not depth:  # ? top level string
+                            return start, index
+
+                    continue
+            elif (match := _STRUCTURE.search(self._buffer, index)) is not None:
+                index = match.end()
+
+                match self._buffer[match.start()]:
+                    case 0x22:  # ? "
+                        string_start = match.start()
+                    case 0x7b | 0x5b:  # ? { [
+                        depth += 1
+                    case _:
+                        depth -= 1
+
+                if not depth and string_start is None:
+                    return start, index
+
+                continue
+
+            # ? strings are never split while skipping, the escape check looks behind the quote
+            index = len(self._buffer)
+            shift = await self._fill(
+                start
+                if keep else
+                string_start
+                if string_start is not None else
+                index
+            )
+            start -= shift
+            index -= shift
+
+            if string_start is not None:
+                string_start -= shift
+
+    async def value(self) -> Any:
+        start, end = await self._scan(keep=True)
+        self._pos = end
+
+        return loads(bytes(self._buffer[start:end]))
+
+    async def skip(self) -> None:
+        _, end = await self._scan(keep=False)
+        self._pos = end
+
+    async def items(self) -> AsyncIterator[Any]:
+        await self.expect(b'[')
+
+        if await self.peek() == 0x5d:  # ? ]
+            self._pos += 1
+            return
+
+        while True:
+            yield await self.value()
+
+            if await self.expect(b',', b']') == b']':
+                return
+
+    async def keys(self) -> AsyncIterator[str]:
+        """yields each key of the top level object, the caller must consume its value"""
+        await self.expect(b'{')
+
+        if await self.peek() == 0x7d:  # ? }
+            self._pos += 1
+            return
+
+        while True:
+            key = await self.value()
+
+            if not isinstance(key, str):
+                raise ExportFormatError('expected an object key')
+
+            await self.expect(b':')
+            yield key
+
+            if await self.expect(b',', b'}') == b'}':
+                return
+
+
+@cache
+def _item_adapter(model: ExportModel, key: str) -> TypeAdapter | None:
+    field = model.model_fields.get(key)
+
+    if field is None or get_origin(field.annotation) is not list:
+        return None
+
+    return TypeAdapter(get_args(field.annotation)[0])
+
+
+def _sniff_item(key: str, item: Any) -> ExportModel | None:
+    # ? member shapes differ between formats even where the top level keys don't
+    if key != 'members' or not isinstance(item, dict):
+        return None
+
+    if 'uuid' in item:
+        return PluralKitExport
+
+    if 'userproxy' in item or '_id' in item:
+        return PluralExport
+
+    return StandardExport
+
+
+class ExportStream:
+    STREAMED_KEYS: ClassVar[set[str]] = {'members', 'groups', 'tuppers', 'messages', 'latches', 'replies', 'switches'}
+
+    def __init__(self, chunks: AsyncIterator[bytes]) -> None:
+        self.reader = JsonStreamReader(_decoded(chunks))
+        self.model: ExportModel | None = None
+        self.fields: dict[str, Any] = {}
+        # ? items read before the format was known, validated once it is
+        self._pending: dict[str, list[Any]] = {}
+
+    def _detect(self, model: ExportModel) -> None:
+        self.model = model
+
+        for key, items in self._pending.items():
+            self.fields[key] = self._validate_items(key, items)
+
+        self._pending.clear()
+
+    def _validate_items(self, key: str, items: list[Any]) -> list[Any]:
+        assert self.model is not None
+
+        if (adapter := _item_adapter(self.model, key)) is None:
+            return items
+
+        return [adapter.validate_python(item) for item in items]
+
+    async def _read_items(self, key: str) -> None:
+        items: list[Any] = []
+
+        async for item in self.reader.items():
+            if self.model is None and (model := _sniff_item(key, item)) is not None:
+                self._pending[key] = items
+                self._detect(model)
+                items = self.fields[key]
+
+            if self.model is None:
+                items.append(item)
+            elif (adapter := _item_adapter(self.model, key)) is not None:
+                items.append(adapter.validate_python(item))
+            else:
+                items.append(item)
+
+        if self.model is None:
+            self._pending[key] = items
+        else:
+            self.fields[key] = items
+
+    async def read(self) -> BaseExport:
+        async for key in self.reader.keys():
+            if self.model is None and key in _FORMAT_KEYS:
+                self._detect(_FORMAT_KEYS[key])
+
+            if self.model is not None and key in _SKIPPED_KEYS.get(self.model, {}):
+                await self.reader.skip()
+                continue
+
+            if key in self.STREAMED_KEYS and await self.reader.peek() == 0x5b:  # ? [
+                await self._read_items(key)
+                continue
+
+            self.fields[key] = await self.reader.value()
+
+        if self.model is None:
+            self._detect(StandardExport)
+
+        assert self.model is not None
+
+        return self.model.model_validate({
+            **_SKIPPED_KEYS.get(self.model, {}),
+            **self.fields
+        })
+
+
+async def read_export(chunks: AsyncIterator[bytes]) -> BaseExport:
+    """reads an export of any supported format, optionally gzipped, validating it exactly once"""
+    return await ExportStream(chunks).read()
@@ -1,15 +1,30 @@
 from src.discord import GatewayEvent, GatewayEventName, MessageReactionAddEvent, MessageCreateEvent, MessageUpdateEvent, Interaction, InteractionType
-from src.core.auth import discord_key_validator, gateway_key_validator
-from fastapi import APIRouter, HTTPException, Depends
+from src.core.auth import discord_key_validator, gateway_key_validator, verify_gateway_signature
+from fastapi import APIRouter, HTTPException, Depends, Request, WebSocket, WebSocketDisconnect
 from src.discord.http import _get_mime_type_for_image
+from src.db.blobs import blob_response
 from fastapi.responses import Response, JSONResponse
 from src.discord.types import ListenerType
 from src.db import HTTPCache, CFCDNProxy
-from src.discord.listeners import emit
-from asyncio import create_task
+from src.discord.listeners import emit, should_emit
+from collections.abc import Coroutine
+from src.core.supervisor import supervisor, TaskClass, SupervisorClosing
+from src.core.dedup import event_dedup
+from asyncio import Queue, create_task, gather, wait_for
+from collections import deque
+from pydantic import ValidationError
+from orjson import dumps, loads
+from secrets import token_hex
+from typing import Annotated, Any
+import logfire
 
 router = APIRouter(prefix='/discord', tags=['Discord'])
 PONG = JSONResponse({'type': 1})
+# ? events a gateway websocket may have in flight before it has to wait for acks
+GATEWAY_CREDITS = 512
+GATEWAY_IDENTIFY_TIMEOUT = 10
+# ? how long a closed websocket waits for the frame being handed off
+GATEWAY_DRAIN_TIMEOUT = 10
 
 ACCEPTED_EVENTS = {
     GatewayEventName.MESSAGE_CREATE,
@@ -21,74 +36,371 @@ ACCEPTED_EVENTS = {
     GatewayEventName.INTERACTION_CREATE,
 }
 
+LISTENER_TYPES = {
+    GatewayEventName.MESSAGE_CREATE: ListenerType.MESSAGE_CREATE,
+    GatewayEventName.MESSAGE_UPDATE: ListenerType.MESSAGE_UPDATE,
+    GatewayEventName.MESSAGE_REACTION_ADD: ListenerType.MESSAGE_REACTION_ADD,
+}
+
+# ? events waiting to be dispatched, one queue per channel with a dispatch running
+_channel_queues: dict[int | None, deque[GatewayEvent]] = {}
+
 
 @router.post(
     '/interaction',
-    include_in_schema=False,
-    dependencies=[Depends(discord_key_validator)])
+    include_in_schema=False)
 async def post__interaction(
-    interaction: Interaction
+    interaction: Annotated[Interaction, Depends(discord_key_validator)]
 ) -> Response:
     # ? immediately pong for pings
     if interaction.type == InteractionType.PING:
         return PONG
 
+    key = (GatewayEventName.INTERACTION_CREATE, str(interaction.id))
+
+    if event_dedup.check(key):
+        return Response(status_code=202)
+
     await interaction.populate()
 
-    create_task(emit(
-        ListenerType.INTERACTION,
-        interaction
-    ))
+    try:
+        await supervisor.submit(TaskClass.INTERACTION, emit(
+            ListenerType.INTERACTION,
+            interaction
+        ))
+    except SupervisorClosing:
+        raise HTTPException(503, 'Shutting down')
 
-    return Response(status_code=202)
+    event_dedup.mark(key)
 
+    return Response(status_code=202)
 
-@router.post(
-    '/event',
-    include_in_schema=False,
-    dependencies=[Depends(gateway_key_validator)])
-async def post__event(
-    event: GatewayEvent
-) -> Response:
-    if event.name not in ACCEPTED_EVENTS:
-        return Response(event.name, status_code=200)
 
+async def _event_task(event: GatewayEvent) -> Coroutine[Any, Any, None]:
     match event.name:
         case GatewayEventName.INTERACTION_CREATE:
-            task = emit(
+            return emit(
                 ListenerType.INTERACTION,
-                Interaction.validate_and_populate(event.data)
-            )
+                await Interaction.validate_and_populate(event.data))
         case GatewayEventName.MESSAGE_CREATE:
-            task = emit(
+            return emit(
                 ListenerType.MESSAGE_CREATE,
-                await MessageCreateEvent.validate_and_populate(event.data))
+                MessageCreateEvent(**event.data))  # ? populated lazily by listeners
         case GatewayEventName.MESSAGE_UPDATE:
-            task = emit(
+            return emit(
                 ListenerType.MESSAGE_UPDATE,
-                await MessageUpdateEvent.validate_and_populate(event.data))
+                MessageUpdateEvent(**event.data))  # ? populated lazily by listeners
         case GatewayEventName.MESSAGE_REACTION_ADD:
-            task = emit(
+            return emit(
                 ListenerType.MESSAGE_REACTION_ADD,
                 await MessageReactionAddEvent.validate_and_populate(event.data))
         case GatewayEventName.GUILD_UPDATE:
-            task = HTTPCache.invalidate(f'/guilds/{event.data['id']}')
+            return HTTPCache.invalidate(f'/guilds/{event.data['id']}')
         case GatewayEventName.CHANNEL_UPDATE:
-            task = HTTPCache.invalidate(f'/channels/{event.data['id']}')
+            return HTTPCache.invalidate(f'/channels/{event.data['id']}')
         case GatewayEventName.GUILD_ROLE_UPDATE:
-            task = HTTPCache.invalidate(f'/guilds/{event.data['guild_id']}')
+            return HTTPCache.invalidate(f'/guilds/{event.data['guild_id']}')
         case _:
             raise HTTPException(500, 'event accepted but not handled')
 
-    create_task(task)
 
-    return Response(event.name, status_code=200)
+async def _dispatch_channel(
+    channel_id: int | None,
+    queue: deque[GatewayEvent]
+) -> None:
+    # ? events for the same channel are handled one after another, so proxies keep their order.
+    # ? batches that arrive while this runs append to the queue instead of dispatching alongside it
+    try:
+        while queue:
+            event = queue.popleft()
+
+            try:
+                await (await _event_task(event))
+            except Exception as e:
+                logfire.error(
+                    'failed to dispatch {event_name} event',
+                    event_name=event.name,
+                    _exc_info=e
+                )
+    finally:
+        # ? a dispatcher that lost the race to register its queue has nothing to clean up
+        if _channel_queues.get(channel_id) is queue:
+            del _channel_queues[channel_id]
+
+
+def _dedup_key(name: str | None, data: dict) -> tuple | None:
+    match name:
+        case GatewayEventName.INTERACTION_CREATE | GatewayEventName.MESSAGE_CREATE:
+            return (name, data.get('id'))
+        case GatewayEventName.MESSAGE_UPDATE:
+            return (name, data.get('id'), data.get('edited_timestamp'))
+        case GatewayEventName.MESSAGE_REACTION_ADD:
+            emoji = data.get('emoji') or {}
+            return (
+                name,
+                data.get('message_id'),
+                data.get('user_id'),
+                emoji.get('id') or emoji.get('name'))
+        case _:  # ? cache invalidations are idempotent
+            return None
+
+
+async def _prefilter_event(payload: dict) -> GatewayEvent | None:
+    # ? drop irrelevant events from the raw json, before any models are built
+    if not isinstance(payload, dict):
+        raise ValueError('event must be an object')
+
+    name = payload.get('t')
+
+    if name not in ACCEPTED_EVENTS:
+        return None
+
+    # ? the gateway retries deliveries that time out, drop redelivered events.
+    # ? events are only marked once they've been submitted, in _submit_batch
+    if (
+        (key := _dedup_key(name, payload.get('d') or {})) is not None and
+        event_dedup.check(key)
+    ):
+        return None
+
+    if (
+        (listener_type := LISTENER_TYPES.get(name)) is not None and
+        not await should_emit(listener_type, payload.get('d') or {})
+    ):
+        return None
+
+    return GatewayEvent.model_validate(payload)
+
+
+def _parse_batch(body: bytes, content_type: str | None) -> list[dict]:
+    if content_type is not None and content_type.startswith('application/x-ndjson'):
+        return [
+            loads(line)
+            for line in body.splitlines()
+            if line.strip()
+        ]
+
+    events = loads(body)
+
+    if not isinstance(events, list):
+        raise ValueError('batch body must be an array of events')
+
+    return events
+
+
+async def _prefilter_batch(payloads: list[dict]) -> list[GatewayEvent]:
+    return [
+        event
+        for event in
+        await gather(*[
+            _prefilter_event(payload)
+            for payload in payloads])
+        if event is not None
+    ]
+
+
+async def _submit_batch(events: list[GatewayEvent]) -> int:
+    channels: dict[int | None, list[GatewayEvent]] = {}
+
+    for event in events:
+        channels.setdefault(
+            event.data.get('channel_id'), []
+        ).append(event)
+
+    for channel_id, channel_events in channels.items():
+        if (queue := _channel_queues.get(channel_id)) is None:
+            # ? the queue is only registered once the dispatcher is accepted, so a refused or
+            # ? cancelled submit never holds events other requests have already queued behind it
+            queue = deque()
+            await supervisor.submit(
+                TaskClass.EVENT, _dispatch_channel(channel_id, queue))
+
+            # ? another request may have started this channel while we waited on backpressure,
+            # ? its dispatcher takes our events and ours finds an empty queue
+            queue = _channel_queues.setdefault(channel_id, queue)
+
+        queue.extend(channel_events)
+
+        for event in channel_events:
+            if (key := _dedup_key(event.name, event.data)) is not None:
+                event_dedup.mark(key)
+
+    return sum(len(channel_events) for channel_events in channels.values())
+
+
+@router.post(
+    '/event',
+    include_in_schema=False,
+    dependencies=[Depends(gateway_key_validator)])
+async def post__event(
+    request: Request
+) -> Response:
+    try:
+        payload = loads(await request.body())
+        event = await _prefilter_event(payload)
+    except (ValueError, ValidationError):
+        raise HTTPException(400, 'Invalid request body')
+
+    if event is not None:
+        try:
+            await _submit_batch([event])
+        except SupervisorClosing:
+            raise HTTPException(503, 'Shutting down')
+
+    return Response(payload.get('t'), status_code=200)
+
+
+@router.post(
+    '/events',
+    include_in_schema=False,
+    dependencies=[Depends(gateway_key_validator)])
+async def post__events(
+    request: Request
+) -> Response:
+    try:
+        payloads = _parse_batch(
+            await request.body(),
+            request.headers.get('content-type'))
+        events = await _prefilter_batch(payloads)
+    except (ValueError, ValidationError):
+        raise HTTPException(400, 'Invalid request body')
+
+    try:
+        accepted = await _submit_batch(events)
+    except SupervisorClosing:
+        raise HTTPException(503, 'Shutting down')
+
+    return JSONResponse({
+        'accepted': accepted,
+        'ignored': len(payloads) - accepted
+    })
+
+
+async def _receive_frame(websocket: WebSocket) -> Any:
+    message = await websocket.receive()
+
+    if message['type'] == 'websocket.disconnect':
+        raise WebSocketDisconnect(message.get('code', 1000))
+
+    return loads(message.get('bytes') or message.get('text') or b'')
+
+
+async def _send_frame(websocket: WebSocket, frame: dict) -> None:
+    await websocket.send_text(dumps(frame).decode())
+
+
+@router.websocket('/gateway')
+async def websocket__gateway(
+    websocket: WebSocket
+) -> None:
+    # ? hello -> identify (nonce signed with the gateway key) -> ready, then
+    # ? dispatch frames spend credits, which are returned in each ack once
+    # ? the events have been handed to the supervisor
+    await websocket.accept()
+
+    nonce = token_hex(16)
+    credits = GATEWAY_CREDITS
+    frames: Queue[dict | None] = Queue()
+    closing = False
+
+    async def ack_frames() -> None:
+        nonlocal credits
+
+        while (frame := await frames.get()) is not None and not closing:
+            payloads = frame['events']
+
+            try:
+                accepted = await _submit_batch(
+                    await _prefilter_batch(payloads))
+            except (ValueError, ValidationError):
+                await websocket.close(1003, 'Invalid event')
+                return
+            except SupervisorClosing:  # ? unacked, the sender redelivers it elsewhere
+                await websocket.close(1012, 'Shutting down')
+                return
+            except Exception as e:
+                # ? unacked, closing lets the sender reconnect and redeliver instead of stalling
+                logfire.error('failed to submit gateway frame', _exc_info=e)
+                await websocket.close(1011, 'Internal error')
+                return
+
+            credits += len(payloads)
+
+            if closing:  # ? submitted, the sender redelivers it and it's deduplicated
+                return
+
+            await _send_frame(websocket, {
+                'op': 'ack',
+                'seq': frame.get('seq'),
+                'accepted': accepted,
+                'ignored': len(payloads) - accepted,
+                'credits': len(payloads)
+            })
+
+    acker = None
+    try:
+        await _send_frame(websocket, {'op': 'hello', 'nonce': nonce})
+
+        try:
+            identify = await wait_for(
+                _receive_frame(websocket), GATEWAY_IDENTIFY_TIMEOUT)
+        except TimeoutError:
+            await websocket.close(1008, 'Identify timed out')
+            return
+
+        if not (
+            isinstance(identify, dict) and
+            identify.get('op') == 'identify' and
+            verify_gateway_signature(
+                str(identify.get('timestamp')),
+                nonce.encode(),
+                str(identify.get('signature')))
+        ):
+            await websocket.close(1008, 'Invalid identify signature')
+            return
+
+        await _send_frame(websocket, {'op': 'ready', 'credits': credits})
+
+        # ? frames are handed off in the order they were received
+        acker = create_task(ack_frames())
+
+        while not acker.done():
+            frame = await _receive_frame(websocket)
+
+            if not (
+                isinstance(frame, dict) and
+                frame.get('op') == 'dispatch' and
+                isinstance(frame.get('events'), list)
+            ):
+                await websocket.close(1003, 'Invalid frame')
+                return
+
+            if len(frame['events']) > credits:
+                await websocket.close(1008, 'Credits exceeded')
+                return
+
+            credits -= len(frame['events'])
+            frames.put_nowait(frame)
+    except (WebSocketDisconnect, ValueError):
+        pass
+    finally:
+        if acker is not None and not acker.done():
+            # ? the frame being handed off is finished rather than cancelled halfway,
+            # ? queued frames are left for the sender to redeliver
+            closing = True
+            frames.put_nowait(None)
+
+            try:
+                await wait_for(acker, GATEWAY_DRAIN_TIMEOUT)
+            except Exception:
+                pass
 
 
 @router.get(
     '/imageproxy/{proxy_id}',
     include_in_schema=False)
 async def get__imageproxy(
+    request: Request,
     proxy_id: str
 ) -> Response:
 
@@ -97,7 +409,21 @@ async def get__imageproxy(
     if proxy is None:
         raise HTTPException(404, 'image not found')
 
-    return Response(
-        content=proxy.data,
-        media_type=_get_mime_type_for_image(proxy.data[:16])
+    if proxy.blob is None:
+        if proxy.data is None:
+            raise HTTPException(404, 'image not found')
+
+        try:
+            media_type = _get_mime_type_for_image(proxy.data[:16])
+        except ValueError:
+            media_type = None
+
+        return Response(content=proxy.data, media_type=media_type)
+
+    # ? proxies only live for a few minutes, no point in caching them for longer
+    return await blob_response(
+        request,
+        proxy.blob,
+        proxy.content_type,
+        max_age=300
     )
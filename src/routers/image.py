@@ -1,4 +1,5 @@
-from fastapi import HTTPException, APIRouter
+from fastapi import HTTPException, APIRouter, Request
+from src.db.blobs import blob_response
 from fastapi.responses import Response
 from beanie import PydanticObjectId
 from src.docs import image as docs
@@ -11,13 +12,18 @@ router = APIRouter(prefix='/image', tags=['Image'])
 @router.get(
     '/{image_id}.{extension}',
     responses=docs.get__image)
-async def get__image(image_id: PydanticObjectId, extension: str) -> Response:
+async def get__image(
+    request: Request,
+    image_id: PydanticObjectId,
+    extension: str
+) -> Response:
     image = await Image.find_one({'_id': image_id})
 
-    if image is None:
+    if image is None or image.blob is None:
         raise HTTPException(404, 'image not found')
 
-    return Response(
-        content=image.data,
-        media_type=guess_type(f'{image_id}.{image.extension}')[0]
+    return await blob_response(
+        request,
+        image.blob,
+        guess_type(f'{image_id}.{image.extension}')[0]
     )
@@ -73,6 +73,7 @@ async def patch__member(
                 if current_group.id != new_group.id:
                     current_group.members.remove(member.id)
                     new_group.members.add(member.id)
+                    member.group = new_group.id
 
                     tasks.append(current_group.save_changes())
                     tasks.append(new_group.save_changes())